@@ -17,10 +17,17 @@ ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY', '')
 CODE_PREFIX = os.environ.get('CODE_PREFIX', '')  # 自定义代码前缀，默认使用 bot 用户名（不带@）
 
 MAX_COLLECTION_FILES = 999
-AUTO_SEND_INTERVAL = 5  # 秒
 GROUP_SEND_SIZE = 10  # 每组最多10个
+CHAT_SEND_INTERVAL = float(os.environ.get('CHAT_SEND_INTERVAL', '1.0'))  # 同一聊天两次发送请求的最小间隔（秒）
+GLOBAL_SEND_RATE = float(os.environ.get('GLOBAL_SEND_RATE', '25'))       # 所有聊天合计每秒最多发送的消息数
+SEND_RETRIES = int(os.environ.get('SEND_RETRIES', '3'))                  # 触发 flood 限制后的最大重试次数
+STATUS_EDIT_INTERVAL = 3  # 进度消息最短更新间隔（秒）
 CODE_LENGTH = 32  # 随机码长度
 DB_PATH = './data/fileid.db'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))              # 连接池保留的空闲连接数
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', '16384'))  # 每个连接的页缓存（KB）
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', '134217728'))      # 内存映射读取上限（字节）
+COLLECTION_CACHE_SIZE = int(os.environ.get('COLLECTION_CACHE_SIZE', '64'))  # 内存中缓存的已完成集合数
 
 FILE_TYPE_MAP = {
     'photo': '🖼 图片',
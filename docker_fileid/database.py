@@ -1,21 +1,49 @@
 """数据库操作模块"""
 import sqlite3
 import logging
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
-from config import DB_PATH
+from config import DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, COLLECTION_CACHE_SIZE
 from crypto import encrypt_file_id, decrypt_file_id
+from sqlite_pool import ConnectionPool
 
 logger = logging.getLogger(__name__)
 
+_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE)
+
+# 已完成集合的 LRU 缓存：code -> (集合信息, 按 sort_order 排好的文件列表)
+# 已完成的集合内容不再变化，修改集合的函数会清除对应缓存；缓存中的对象由调用方只读使用
+_collection_cache: "OrderedDict[str, Tuple[Dict, List[Dict]]]" = OrderedDict()
+
+
+def _cache_get(code: str) -> Optional[Tuple[Dict, List[Dict]]]:
+    entry = _collection_cache.get(code)
+    if entry is not None:
+        _collection_cache.move_to_end(code)
+    return entry
+
+
+def _cache_put(code: str, col: Dict, files: List[Dict]):
+    _collection_cache[code] = (col, files)
+    _collection_cache.move_to_end(code)
+    while len(_collection_cache) > COLLECTION_CACHE_SIZE:
+        _collection_cache.popitem(last=False)
+
+
+def _cache_invalidate(code: str):
+    _collection_cache.pop(code, None)
+
 
 def get_db():
-    """获取数据库连接（启用 WAL 模式和超时）"""
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """从连接池借出数据库连接（WAL 模式，close() 时归还）"""
+    return _pool.acquire()
+
+
+def close_db():
+    """关闭连接池中的空闲连接"""
+    _pool.close_all()
 
 
 def init_db():
@@ -60,7 +88,9 @@ def init_db():
                 FOREIGN KEY (collection_code) REFERENCES collections(code),
                 FOREIGN KEY (file_code) REFERENCES file_mappings(code)
             );
-            CREATE INDEX IF NOT EXISTS idx_ci_col ON collection_items(collection_code);
+            -- 覆盖索引：按集合取文件时直接按 sort_order 有序读取，无需回表和排序
+            DROP INDEX IF EXISTS idx_ci_col;
+            CREATE INDEX IF NOT EXISTS idx_ci_col_order ON collection_items(collection_code, sort_order, file_code);
         ''')
         conn.commit()
         logger.info("数据库初始化完成")
@@ -139,6 +169,9 @@ def get_file(code: str) -> Optional[Dict]:
 
 def get_collection(code: str) -> Optional[Dict]:
     """获取集合信息"""
+    cached = _cache_get(code)
+    if cached:
+        return cached[0]
     conn = get_db()
     try:
         row = conn.execute("SELECT * FROM collections WHERE code = ?", (code,)).fetchone()
@@ -149,22 +182,66 @@ def get_collection(code: str) -> Optional[Dict]:
         conn.close()
 
 
+_COLLECTION_FILES_SQL = """SELECT fm.* FROM collection_items ci
+                           JOIN file_mappings fm ON fm.code = ci.file_code
+                           WHERE ci.collection_code = ?
+                           ORDER BY ci.sort_order"""
+
+
+def _load_completed(conn, code: str) -> Optional[Tuple[Dict, List[Dict]]]:
+    """读取集合；已完成的集合整体加载并放入缓存"""
+    cached = _cache_get(code)
+    if cached:
+        return cached
+    row = conn.execute("SELECT * FROM collections WHERE code = ?", (code,)).fetchone()
+    if not row:
+        return None
+    col = dict(row)
+    if col['status'] != 'completed':
+        return col, None
+    files = [dict(r) for r in conn.execute(_COLLECTION_FILES_SQL, (code,)).fetchall()]
+    _cache_put(code, col, files)
+    return col, files
+
+
 def get_collection_files(code: str) -> List[Dict]:
     """获取集合中的所有文件"""
+    cached = _cache_get(code)
+    if cached:
+        return list(cached[1])
     conn = get_db()
     try:
-        rows = conn.execute(
-            """SELECT fm.* FROM file_mappings fm
-               JOIN collection_items ci ON fm.code = ci.file_code
-               WHERE ci.collection_code = ?
-               ORDER BY ci.sort_order""",
-            (code,)
-        ).fetchall()
+        loaded = _load_completed(conn, code)
+        if loaded and loaded[1] is not None:
+            return list(loaded[1])
+        rows = conn.execute(_COLLECTION_FILES_SQL, (code,)).fetchall()
         return [dict(r) for r in rows]
     finally:
         conn.close()
 
 
+def get_collection_page(code: str, offset: int, limit: int) -> Tuple[Optional[Dict], List[Dict], int]:
+    """分页获取集合文件，返回 (集合信息, 本页文件, 文件总数)
+
+    已完成的集合从缓存切片；未完成的集合用 LIMIT/OFFSET 走 (collection_code, sort_order) 索引只读取本页。
+    """
+    conn = get_db()
+    try:
+        loaded = _load_completed(conn, code)
+        if not loaded:
+            return None, [], 0
+        col, files = loaded
+        if files is not None:
+            return col, files[offset:offset + limit], len(files)
+        total = conn.execute(
+            "SELECT COUNT(*) FROM collection_items WHERE collection_code = ?", (code,)
+        ).fetchone()[0]
+        rows = conn.execute(_COLLECTION_FILES_SQL + " LIMIT ? OFFSET ?", (code, limit, offset)).fetchall()
+        return col, [dict(r) for r in rows], total
+    finally:
+        conn.close()
+
+
 def create_collection(code: str, bot_username: str, name: str, user_id: int) -> bool:
     """创建新集合"""
     conn = get_db()
@@ -198,6 +275,7 @@ def add_file_to_collection(col_code: str, file_code: str, sort_order: int) -> bo
             (sort_order, now, col_code)
         )
         conn.commit()
+        _cache_invalidate(col_code)
         return True
     except Exception as e:
         logger.error("添加文件到集合失败: %s", e)
@@ -216,6 +294,7 @@ def complete_collection(col_code: str, file_count: int) -> bool:
             (file_count, now, col_code)
         )
         conn.commit()
+        _cache_invalidate(col_code)
         return True
     except Exception as e:
         logger.error("完成集合失败: %s", e)
@@ -231,6 +310,7 @@ def delete_collection(col_code: str) -> bool:
         conn.execute("DELETE FROM collection_items WHERE collection_code = ?", (col_code,))
         conn.execute("DELETE FROM collections WHERE code = ?", (col_code,))
         conn.commit()
+        _cache_invalidate(col_code)
         return True
     except Exception as e:
         logger.error("删除集合失败: %s", e)
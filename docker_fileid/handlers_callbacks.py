@@ -1,21 +1,30 @@
 """回调按钮处理器模块"""
-import asyncio
 import logging
 import traceback
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from config import AUTO_SEND_INTERVAL, GROUP_SEND_SIZE, FILE_TYPE_MAP
-from database import get_collection, get_collection_files
+from config import FILE_TYPE_MAP
+from database import get_collection_files, get_collection_page
 from utils import escape_markdown
-from senders import send_file_group
+from senders import send_file_group, deliver_files
 
 logger = logging.getLogger(__name__)
 
 PER_PAGE = 5  # 每页文件数
 
 
+def _load_page(col_code: str, page: int):
+    """读取集合第 page 页（超出范围时取最后一页），返回 (集合信息, 本页文件, 文件总数, 实际页码)"""
+    col_info, page_files, total = get_collection_page(col_code, (max(page, 1) - 1) * PER_PAGE, PER_PAGE)
+    total_pages = (total + PER_PAGE - 1) // PER_PAGE
+    if total and page > total_pages:
+        page = total_pages
+        col_info, page_files, total = get_collection_page(col_code, (page - 1) * PER_PAGE, PER_PAGE)
+    return col_info, page_files, total, max(page, 1)
+
+
 def _resolve_key(context, sk: str) -> str:
     """从短 key 映射回集合代码"""
     cb_map = context.bot_data.get('cb_map', {})
@@ -211,10 +220,9 @@ async def _send_paginated(context, chat_id, col_code, sk, page=1, query=None):
     """分页发送集合文件：每次发送 PER_PAGE 个，带页码按钮，已发送页显示✅"""
     logger.info("_send_paginated: col_code=%s, sk=%s, page=%d", col_code, sk, page)
 
-    files = get_collection_files(col_code)
-    col_info = get_collection(col_code)
+    col_info, page_files, total, page = _load_page(col_code, page)
 
-    if not files or not col_info:
+    if not total or not col_info:
         msg = "⚠️ 集合为空或不存在。"
         if query:
             try:
@@ -223,11 +231,7 @@ async def _send_paginated(context, chat_id, col_code, sk, page=1, query=None):
                 await context.bot.send_message(chat_id=chat_id, text=msg)
         return
 
-    total = len(files)
     total_pages = (total + PER_PAGE - 1) // PER_PAGE
-    page = max(1, min(page, total_pages))
-    start = (page - 1) * PER_PAGE
-    page_files = files[start:start + PER_PAGE]
 
     # 记录已发送的页面
     sent_key = f"sent_pages_{sk}"
@@ -325,28 +329,17 @@ async def _send_all(context, chat_id, col_code, query=None):
         return
 
     total = len(files)
-
-    pv = [f for f in files if f['file_type'] in ('photo', 'video')]
-    docs = [f for f in files if f['file_type'] == 'document']
-    audios = [f for f in files if f['file_type'] in ('audio', 'voice')]
-    logger.info("分组: photo+video=%d, document=%d, audio=%d", len(pv), len(docs), len(audios))
-
     await context.bot.edit_message_text(chat_id=chat_id, message_id=status_msg.message_id, text=f"📤 正在发送... (0/{total})")
 
-    sent_count = 0
-    batch_num = 0
-    for group in [pv, docs, audios]:
-        for i in range(0, len(group), GROUP_SEND_SIZE):
-            batch = group[i:i + GROUP_SEND_SIZE]
-            try:
-                sent = await send_file_group(context, chat_id, batch)
-                sent_count += sent
-                logger.info("batch: sent=%d, total=%d/%d", sent, sent_count, total)
-            except Exception as e:
-                logger.error("批量发送失败: %s", e, exc_info=True)
-            batch_num += 1
-            if batch_num % 2 == 0:
-                await asyncio.sleep(2)
+    async def on_progress(sent):
+        try:
+            await context.bot.edit_message_text(chat_id=chat_id, message_id=status_msg.message_id,
+                                                text=f"📤 正在发送... ({sent}/{total})")
+        except Exception:
+            pass
+
+    result = await deliver_files(context.bot, chat_id, files, on_progress=on_progress)
+    sent_count = result['sent']
 
     result_text = f"✅ 发送完成！成功 {sent_count}/{total}"
     logger.info("_send_all 完成: %s", result_text)
@@ -357,7 +350,7 @@ async def _send_all(context, chat_id, col_code, query=None):
 
 
 async def _auto_send(context, chat_id, col_code, user_id, query=None):
-    """自动发送集合文件（每组间隔）"""
+    """自动发送集合文件（按限速连续发送，可随时停止）"""
     logger.info("_auto_send 开始: col_code=%s, chat_id=%s, user_id=%s", col_code, chat_id, user_id)
     files = get_collection_files(col_code)
     logger.info("_auto_send: 查询到 %d 个文件", len(files) if files else 0)
@@ -380,37 +373,24 @@ async def _auto_send(context, chat_id, col_code, user_id, query=None):
         chat_id=chat_id, text=f"▶️ 自动发送中... (0/{total})", reply_markup=reply_markup
     )
 
-    pv = [f for f in files if f['file_type'] in ('photo', 'video')]
-    docs = [f for f in files if f['file_type'] == 'document']
-    audios = [f for f in files if f['file_type'] in ('audio', 'voice')]
-
-    all_groups = []
-    for lst in [pv, docs, audios]:
-        for i in range(0, len(lst), GROUP_SEND_SIZE):
-            all_groups.append(lst[i:i + GROUP_SEND_SIZE])
-
-    sent_count = 0
-    for idx, group in enumerate(all_groups):
-        if context.user_data.get('stop_auto_send'):
-            await context.bot.send_message(chat_id=chat_id, text=f"⏹ 已停止。成功发送 {sent_count}/{total} 个文件。")
-            return
-
-        try:
-            sent_count += await send_file_group(context, chat_id, group)
-        except Exception as e:
-            logger.error("自动发送组失败: %s", e)
-
+    async def on_progress(sent):
         try:
             await context.bot.edit_message_text(
                 chat_id=chat_id, message_id=status_msg.message_id,
-                text=f"▶️ 自动发送中... ({sent_count}/{total})",
+                text=f"▶️ 自动发送中... ({sent}/{total})",
                 reply_markup=reply_markup
             )
         except Exception:
             pass
 
-        if idx < len(all_groups) - 1:
-            await asyncio.sleep(AUTO_SEND_INTERVAL)
+    result = await deliver_files(
+        context.bot, chat_id, files, on_progress=on_progress,
+        should_stop=lambda: context.user_data.get('stop_auto_send')
+    )
+    sent_count = result['sent']
+    if result['stopped']:
+        await context.bot.send_message(chat_id=chat_id, text=f"⏹ 已停止。成功发送 {sent_count}/{total} 个文件。")
+        return
 
     try:
         await context.bot.edit_message_text(
@@ -425,10 +405,9 @@ async def _auto_send(context, chat_id, col_code, user_id, query=None):
 async def _send_page(context, chat_id, col_code, page, query=None):
     """分页浏览集合（只看列表，不发送文件）"""
     logger.info("_send_page: col_code=%s, page=%d, chat_id=%s", col_code, page, chat_id)
-    files = get_collection_files(col_code)
-    col_info = get_collection(col_code)
-    logger.info("_send_page: files=%d, col_info=%s", len(files) if files else 0, bool(col_info))
-    if not files or not col_info:
+    col_info, page_files, total, page = _load_page(col_code, page)
+    logger.info("_send_page: files=%d, col_info=%s", total, bool(col_info))
+    if not total or not col_info:
         msg = "⚠️ 集合为空或不存在。"
         if query:
             try:
@@ -437,11 +416,8 @@ async def _send_page(context, chat_id, col_code, page, query=None):
                 await context.bot.send_message(chat_id=chat_id, text=msg)
         return
 
-    total = len(files)
     total_pages = (total + PER_PAGE - 1) // PER_PAGE
-    page = max(1, min(page, total_pages))
     start = (page - 1) * PER_PAGE
-    page_files = files[start:start + PER_PAGE]
 
     safe_name = escape_markdown(col_info['name'])
     text = f"📦 *{safe_name}* (第{page}/{total_pages}页，共{total}个文件)\n\n"
@@ -489,9 +465,9 @@ async def _send_page(context, chat_id, col_code, page, query=None):
 async def _send_page_files(context, chat_id, col_code, page, query=None):
     """发送指定页的文件"""
     logger.info("_send_page_files: col_code=%s, page=%d, chat_id=%s", col_code, page, chat_id)
-    files = get_collection_files(col_code)
-    logger.info("_send_page_files: files=%d", len(files) if files else 0)
-    if not files:
+    _, page_files, total = get_collection_page(col_code, (max(page, 1) - 1) * PER_PAGE, PER_PAGE)
+    logger.info("_send_page_files: files=%d", total)
+    if not total:
         msg = "⚠️ 集合为空。"
         if query:
             try:
@@ -500,8 +476,6 @@ async def _send_page_files(context, chat_id, col_code, page, query=None):
                 await context.bot.send_message(chat_id=chat_id, text=msg)
         return
 
-    start = (page - 1) * PER_PAGE
-    page_files = files[start:start + PER_PAGE]
     if not page_files:
         msg = "⚠️ 该页没有文件。"
         if query:
@@ -6,7 +6,7 @@ from telegram.ext import Application, ApplicationBuilder, CommandHandler, Messag
 
 from config import BOT_TOKEN
 from crypto import init_encryption
-from database import init_db
+from database import init_db, close_db
 from handlers_commands import (
     start_command, create_collection_cmd, done_collection_cmd,
     cancel_collection_cmd, get_id_command, my_collections_cmd,
@@ -78,6 +78,11 @@ async def post_init(application):
     logger.info("Bot @%s 已初始化，注册了 %d 个命令", application.bot.username, len(commands))
 
 
+async def post_shutdown(application):
+    """退出时关闭数据库连接"""
+    close_db()
+
+
 def main():
     if not BOT_TOKEN:
         print("❌ 错误: 未设置 BOT_TOKEN 环境变量")
@@ -87,7 +92,7 @@ def main():
     init_db()
     logger.info("FileID Bot 启动中...")
 
-    application = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).build()
+    application = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
 
     # 命令处理器
     application.add_handler(CommandHandler("start", start_command))
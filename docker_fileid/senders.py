@@ -1,15 +1,178 @@
 """文件发送逻辑模块"""
+import asyncio
 import logging
-from typing import List, Dict
+import time
+from typing import List, Dict, Callable, Awaitable, Optional
 
+from telegram.error import RetryAfter, BadRequest
 from telegram.ext import ContextTypes
 from telegram import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
 
-from config import GROUP_SEND_SIZE
+from config import GROUP_SEND_SIZE, CHAT_SEND_INTERVAL, GLOBAL_SEND_RATE, SEND_RETRIES, STATUS_EDIT_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 
+class _SendLimiter:
+    """发送限速：全局按消息条数限速，同一聊天两次请求之间至少间隔 CHAT_SEND_INTERVAL 秒
+
+    时间片按请求开始时间分配，请求耗时计入间隔，不再在请求结束后额外 sleep；
+    触发 RetryAfter 时只暂停该聊天。
+    """
+
+    def __init__(self, chat_interval: float, global_rate: float):
+        self.chat_interval = chat_interval
+        self.global_interval = 1 / global_rate
+        self._global_next = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int, cost: int = 1):
+        now = time.monotonic()
+        chat_slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = chat_slot + self.chat_interval
+        slot = max(chat_slot, self._global_next)
+        self._global_next = slot + self.global_interval * cost
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, chat_id: int, seconds: float):
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), time.monotonic() + seconds)
+
+
+_limiter = _SendLimiter(CHAT_SEND_INTERVAL, GLOBAL_SEND_RATE)
+
+
+async def _limited(chat_id: int, call: Callable[[], Awaitable], cost: int = 1):
+    """限速执行一次发送，RetryAfter 时暂停该聊天后重试"""
+    for attempt in range(SEND_RETRIES + 1):
+        await _limiter.wait(chat_id, cost)
+        try:
+            return await call()
+        except RetryAfter as e:
+            if attempt >= SEND_RETRIES:
+                raise
+            retry_after = e.retry_after
+            delay = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+            logger.warning("chat_id=%s 触发 flood 限制，%.1f 秒后重试", chat_id, delay)
+            _limiter.pause(chat_id, delay)
+
+
+def _media_kind(file_type: str) -> str:
+    """可以放进同一个媒体组的类别：图片+视频相册、文档组、音频组"""
+    if file_type in ('photo', 'video'):
+        return 'visual'
+    if file_type == 'audio':
+        return 'audio'
+    return 'document'  # document, voice
+
+
+def plan_batches(files: List[Dict]) -> List[List[Dict]]:
+    """按类别分组（相册 → 文档 → 音频），每组最多 GROUP_SEND_SIZE 个"""
+    by_kind = {'visual': [], 'document': [], 'audio': []}
+    for f in files:
+        by_kind[_media_kind(f['file_type'])].append(f)
+    batches = []
+    for kind_files in by_kind.values():
+        for i in range(0, len(kind_files), GROUP_SEND_SIZE):
+            batches.append(kind_files[i:i + GROUP_SEND_SIZE])
+    return batches
+
+
+def _input_media(f: Dict, caption: str):
+    fid = f['telegram_file_id']
+    kind = _media_kind(f['file_type'])
+    if kind == 'visual':
+        cls = InputMediaPhoto if f['file_type'] == 'photo' else InputMediaVideo
+        return cls(media=fid, caption=caption[:1024] if caption else "")
+    if kind == 'audio':
+        return InputMediaAudio(media=fid, caption=caption[:1024] if caption else "")
+    return InputMediaDocument(media=fid, caption=caption[:1024] if caption else "")
+
+
+async def _send_single(bot, chat_id: int, f: Dict, caption: str = "") -> int:
+    fid = f['telegram_file_id']
+    cap = caption[:1024] if caption else ""
+    senders = {
+        'photo': lambda: bot.send_photo(chat_id=chat_id, photo=fid, caption=cap),
+        'video': lambda: bot.send_video(chat_id=chat_id, video=fid, caption=cap),
+        'audio': lambda: bot.send_audio(chat_id=chat_id, audio=fid, caption=cap),
+    }
+    try:
+        await _limited(chat_id, senders.get(f['file_type'],
+                                            lambda: bot.send_document(chat_id=chat_id, document=fid, caption=cap)))
+        return 1
+    except Exception as e:
+        logger.error("发送单个文件失败: type=%s, code=%s: %s", f['file_type'], f.get('code'), e)
+        return 0
+
+
+async def _send_batch(bot, chat_id: int, batch: List[Dict], caption: str = "") -> int:
+    """发送一个媒体组，返回成功数
+
+    媒体组因某个文件无效（BadRequest）失败时对半拆开重发，最终只有出错的文件单独发送；
+    其他错误（网络、被拉黑等）不重发，避免重复投递。
+    """
+    if len(batch) == 1:
+        return await _send_single(bot, chat_id, batch[0], caption)
+    media = []
+    for idx, f in enumerate(batch):
+        try:
+            media.append(_input_media(f, caption if idx == 0 else ""))
+        except Exception as e:
+            logger.error("构建媒体列表失败: %s", e)
+    if not media:
+        return 0
+    try:
+        await _limited(chat_id, lambda: bot.send_media_group(chat_id=chat_id, media=media), cost=len(media))
+        return len(media)
+    except BadRequest as e:
+        if 'chat not found' in str(e).lower():
+            logger.error("发送媒体组失败: %s", e)
+            return 0
+        logger.warning("发送媒体组失败（%d 个），拆分重发: %s", len(batch), e)
+        mid = len(batch) // 2
+        return (await _send_batch(bot, chat_id, batch[:mid], caption)
+                + await _send_batch(bot, chat_id, batch[mid:]))
+    except Exception as e:
+        logger.error("发送媒体组失败（%d 个）: %s", len(batch), e)
+        return 0
+
+
+async def deliver_files(
+    bot,
+    chat_id: int,
+    files: List[Dict],
+    caption: str = "",
+    on_progress: Optional[Callable[[int], Awaitable]] = None,
+    should_stop: Optional[Callable[[], bool]] = None
+) -> Dict:
+    """按顺序发送全部文件，节奏完全由限速器控制
+
+    on_progress(已发送数) 在后台执行且至少间隔 STATUS_EDIT_INTERVAL 秒（进度消息编辑不阻塞发送）；
+    should_stop() 返回 True 时在下一组之前停止。返回 {'sent', 'total', 'stopped'}。
+    """
+    sent = 0
+    stopped = False
+    progress_task = None
+    last_progress = time.monotonic()
+
+    for batch in plan_batches(files):
+        if should_stop and should_stop():
+            stopped = True
+            break
+        sent += await _send_batch(bot, chat_id, batch, caption if sent == 0 else "")
+        now = time.monotonic()
+        if on_progress and now - last_progress >= STATUS_EDIT_INTERVAL and (progress_task is None or progress_task.done()):
+            last_progress = now
+            progress_task = asyncio.create_task(on_progress(sent))
+
+    if progress_task and not progress_task.done():
+        await progress_task
+    return {'sent': sent, 'total': len(files), 'stopped': stopped}
+
+
 async def send_file_group(
     context: ContextTypes.DEFAULT_TYPE,
     chat_id: int,
@@ -25,124 +188,5 @@ async def send_file_group(
         return 0
 
     logger.info("send_file_group: 准备发送 %d 个文件到 chat_id=%s", len(files), chat_id)
-
-    # 按类型分组
-    photo_video = []
-    documents = []
-    audios = []
-
-    for f in files:
-        ft = f['file_type']
-        if ft in ('photo', 'video'):
-            photo_video.append(f)
-        elif ft == 'audio':
-            audios.append(f)
-        else:  # document, voice
-            documents.append(f)
-
-    sent_count = 0
-
-    # 1. 发送图片+视频
-    for i in range(0, len(photo_video), GROUP_SEND_SIZE):
-        batch = photo_video[i:i + GROUP_SEND_SIZE]
-        logger.info("发送图片+视频组: %d 个文件", len(batch))
-
-        if len(batch) == 1:
-            f = batch[0]
-            try:
-                fid = f['telegram_file_id']
-                logger.info("发送单个媒体: type=%s, file_id=%s...(len=%d)", f['file_type'], str(fid)[:30], len(str(fid)))
-                if f['file_type'] == 'photo':
-                    await context.bot.send_photo(chat_id=chat_id, photo=fid, caption=caption[:1024] if caption else "")
-                else:
-                    await context.bot.send_video(chat_id=chat_id, video=fid, caption=caption[:1024] if caption else "")
-                sent_count += 1
-            except Exception as e:
-                logger.error("发送单个媒体失败: %s", e, exc_info=True)
-        else:
-            media_list = []
-            for idx, f in enumerate(batch):
-                file_id = f['telegram_file_id']
-                cap = caption if idx == 0 else ""
-                try:
-                    if f['file_type'] == 'photo':
-                        media_list.append(InputMediaPhoto(media=file_id, caption=cap[:1024] if cap else ""))
-                    else:
-                        media_list.append(InputMediaVideo(media=file_id, caption=cap[:1024] if cap else ""))
-                except Exception as e:
-                    logger.error("构建媒体列表失败: %s", e)
-            if media_list:
-                try:
-                    await context.bot.send_media_group(chat_id=chat_id, media=media_list)
-                    sent_count += len(media_list)
-                except Exception as e:
-                    logger.error("发送媒体组失败: %s", e)
-                    for f in batch:
-                        try:
-                            if f['file_type'] == 'photo':
-                                await context.bot.send_photo(chat_id=chat_id, photo=f['telegram_file_id'])
-                            else:
-                                await context.bot.send_video(chat_id=chat_id, video=f['telegram_file_id'])
-                            sent_count += 1
-                        except Exception as e2:
-                            logger.error("降级发送失败: %s", e2)
-
-    # 2. 发送文档
-    for i in range(0, len(documents), GROUP_SEND_SIZE):
-        batch = documents[i:i + GROUP_SEND_SIZE]
-        if len(batch) == 1:
-            try:
-                await context.bot.send_document(chat_id=chat_id, document=batch[0]['telegram_file_id'], caption=caption[:1024] if caption else "")
-                sent_count += 1
-            except Exception as e:
-                logger.error("发送文档失败: %s", e)
-        else:
-            media_list = []
-            for f in batch:
-                try:
-                    media_list.append(InputMediaDocument(media=f['telegram_file_id']))
-                except Exception as e:
-                    logger.error("构建文档列表失败: %s", e)
-            if media_list:
-                try:
-                    await context.bot.send_media_group(chat_id=chat_id, media=media_list)
-                    sent_count += len(media_list)
-                except Exception as e:
-                    logger.error("发送文档组失败: %s", e)
-                    for f in batch:
-                        try:
-                            await context.bot.send_document(chat_id=chat_id, document=f['telegram_file_id'])
-                            sent_count += 1
-                        except Exception as e2:
-                            logger.error("降级发送文档失败: %s", e2)
-
-    # 3. 发送音频
-    for i in range(0, len(audios), GROUP_SEND_SIZE):
-        batch = audios[i:i + GROUP_SEND_SIZE]
-        if len(batch) == 1:
-            try:
-                await context.bot.send_audio(chat_id=chat_id, audio=batch[0]['telegram_file_id'], caption=caption[:1024] if caption else "")
-                sent_count += 1
-            except Exception as e:
-                logger.error("发送音频失败: %s", e)
-        else:
-            media_list = []
-            for f in batch:
-                try:
-                    media_list.append(InputMediaAudio(media=f['telegram_file_id']))
-                except Exception as e:
-                    logger.error("构建音频列表失败: %s", e)
-            if media_list:
-                try:
-                    await context.bot.send_media_group(chat_id=chat_id, media=media_list)
-                    sent_count += len(media_list)
-                except Exception as e:
-                    logger.error("发送音频组失败: %s", e)
-                    for f in batch:
-                        try:
-                            await context.bot.send_audio(chat_id=chat_id, audio=f['telegram_file_id'])
-                            sent_count += 1
-                        except Exception as e2:
-                            logger.error("降级发送音频失败: %s", e2)
-
-    return sent_count
\ No newline at end of file
+    result = await deliver_files(context.bot, chat_id, files, caption)
+    return result['sent']
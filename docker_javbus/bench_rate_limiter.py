@@ -0,0 +1,93 @@
+"""限速器微基准：高并发下对比旧滑动窗口限速器与 GCRA 限速器
+
+用法: python bench_rate_limiter.py [并发等待者数量，默认 2000]
+时间按比例缩小（窗口 1 秒），两种限速器的吞吐上限相同：每个窗口 N/2 次、允许 N/2 次突发。
+输出：总耗时、每次 acquire 的 CPU 开销、等待时间分位数、放行顺序与调用顺序不一致的比例。
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from modules.rate_limiter import RateLimiter
+
+
+class SlidingWindowLimiter:
+    """旧实现（窗口可配置）：每次 acquire 重建时间戳列表，并在持锁时 sleep"""
+
+    def __init__(self, max_per_window: int, window: float):
+        self._max = max_per_window
+        self._window = window
+        self._lock = asyncio.Lock()
+        self._timestamps = []
+
+    async def acquire(self, budget=None):
+        async with self._lock:
+            now = time.monotonic()
+            self._timestamps = [t for t in self._timestamps if now - t < self._window]
+            if len(self._timestamps) >= self._max:
+                wait = self._window - (now - self._timestamps[0]) + 0.001
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                now = time.monotonic()
+                self._timestamps = [t for t in self._timestamps if now - t < self._window]
+            self._timestamps.append(time.monotonic())
+
+
+async def run(limiter, n, budget_of=lambda i: None):
+    grants = []
+    waits = {}
+
+    async def waiter(i):
+        start = time.monotonic()
+        await limiter.acquire(budget_of(i))
+        waits.setdefault(budget_of(i), []).append(time.monotonic() - start)
+        grants.append(i)
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    # 按顺序创建，调用顺序即 i 的顺序
+    await asyncio.gather(*(waiter(i) for i in range(n)))
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    out_of_order = sum(1 for a, b in zip(grants, grants[1:]) if b < a) / max(n - 1, 1)
+    return wall, cpu, waits, out_of_order
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def report(name, wall, cpu, waits, out_of_order, n):
+    all_waits = [w for ws in waits.values() for w in ws]
+    print(f"{name:<14}{wall:>8.2f}s{cpu / n * 1e6:>10.1f}µs"
+          f"{statistics.median(all_waits) * 1000:>10.0f}ms{pct(all_waits, 0.99) * 1000:>10.0f}ms"
+          f"{out_of_order * 100:>9.1f}%")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_window = n // 2
+
+    print(f"{n} 个并发 acquire，每秒上限 {per_window} 次\n")
+    print(f"{'限速器':<14}{'总耗时':>9}{'CPU/次':>12}{'等待p50':>12}{'等待p99':>12}{'乱序':>10}")
+    result = asyncio.run(run(SlidingWindowLimiter(per_window, 1.0), n))
+    report("滑动窗口(旧)", *result, n)
+    result = asyncio.run(run(RateLimiter(per_window * 60, per_window), n))
+    report("GCRA", *result, n)
+
+    # 命名额度：详情接口单独限速为全局的 1/4，详情请求间隔不小于详情额度的间隔
+    print("\n混合请求（1/4 列表，3/4 详情；详情额度为全局的 1/4）")
+    limiter = RateLimiter(per_window * 60, per_window, {"detail": (per_window * 15, 1)})
+    budget_of = lambda i: "list" if i % 4 == 0 else "detail"
+    _, _, waits, _ = asyncio.run(run(limiter, n, budget_of))
+    for budget, ws in sorted(waits.items()):
+        print(f"  {budget:<8}等待 p50 {statistics.median(ws) * 1000:>6.0f}ms  p99 {pct(ws, 0.99) * 1000:>6.0f}ms")
+    stats = limiter.stats()
+    print(f"  统计: global avg_wait={stats['global']['avg_wait'] * 1000:.0f}ms, "
+          f"detail avg_wait={stats['detail']['avg_wait'] * 1000:.0f}ms max_wait={stats['detail']['max_wait'] * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -38,10 +38,52 @@ MAGNET_SORT_ORDER = os.environ.get('MAGNET_SORT_ORDER', 'desc')
 # 并发请求数
 MAX_CONCURRENT = int(os.environ.get('MAX_CONCURRENT', '10'))
 
+# 所有聊天同时执行的收集任务数上限（其余任务排队）
+MAX_ACTIVE_TASKS = int(os.environ.get('MAX_ACTIVE_TASKS', '2'))
+
 # 单次搜索最大页数（防止一次拉太多）
 MAX_PAGES = int(os.environ.get('MAX_PAGES', '20'))
 
+# 边翻页边收集磁力时，待处理影片 ID 队列的最大长度
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '100'))
+
 # API 请求限速：每分钟最大请求数（防止 429）
 RATE_LIMIT = int(os.environ.get('RATE_LIMIT', '30'))
 
+# 限速允许的最大连续突发请求数；默认 1 时任意 60 秒内不超过 RATE_LIMIT 次，
+# 大于 1 时任意 60 秒内最多 RATE_LIMIT + RATE_BURST - 1 次
+RATE_BURST = int(os.environ.get('RATE_BURST', '1'))
+
+# 按接口类型单独限速：每分钟最大请求数（0 表示只受 RATE_LIMIT 限制）
+RATE_LIMIT_LIST = int(os.environ.get('RATE_LIMIT_LIST', '0'))
+RATE_LIMIT_DETAIL = int(os.environ.get('RATE_LIMIT_DETAIL', '0'))
+RATE_LIMIT_MAGNETS = int(os.environ.get('RATE_LIMIT_MAGNETS', '0'))
+
+# HTTP 连接池：总连接数 / 单个主机连接数（未设置或为空时取 max(MAX_CONCURRENT, 10)）
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '32'))
+HTTP_POOL_PER_HOST = int(os.environ.get('HTTP_POOL_PER_HOST') or max(MAX_CONCURRENT, 10))
+
+# HTTP 请求超时（秒）：整个请求 / 建立连接
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '10'))
+
+# API 请求遇到 5xx 或超时时的重试次数，及退避基准时间（秒，指数增长并加随机抖动）
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', '1.0'))
+
+# API 响应缓存文件
+CACHE_PATH = os.environ.get('CACHE_PATH', './data/javbus_cache.db')
+
+# 影片详情缓存有效期（秒），默认 30 天
+CACHE_DETAIL_TTL = int(os.environ.get('CACHE_DETAIL_TTL', str(30 * 86400)))
+
+# 磁力链接缓存有效期（秒），默认 1 天（磁力会陆续新增）
+CACHE_MAGNET_TTL = int(os.environ.get('CACHE_MAGNET_TTL', '86400'))
+
+# 404 结果缓存有效期（秒），默认 1 小时
+CACHE_NEGATIVE_TTL = int(os.environ.get('CACHE_NEGATIVE_TTL', '3600'))
+
+# 缓存最大条目数，超过后淘汰最早过期的条目
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '100000'))
+
 logger.info(f"Config loaded. ADMIN_IDS: {ADMIN_IDS}, API: {JAVBUS_API_URL}")
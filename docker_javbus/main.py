@@ -31,10 +31,13 @@ from modules.handlers import (
     button_callback,
     reply_search_handler,
 )
+from modules.cache import response_cache
+from modules.http_client import start_session, close_session
 
 
 async def post_init(application):
-    """Bot 初始化后自动注册命令列表（让用户在输入框看到命令提示）"""
+    """Bot 初始化后创建共享 HTTP 会话，并自动注册命令列表（让用户在输入框看到命令提示）"""
+    await start_session()
     commands = [
         ("jav", "查询影片磁力链接"),
         ("jav_star", "获取演员全部影片磁力"),
@@ -50,6 +53,12 @@ async def post_init(application):
     logger.info("已注册 %d 个 Telegram 命令", len(commands))
 
 
+async def post_shutdown(application):
+    """Bot 退出前关闭共享 HTTP 会话和响应缓存"""
+    await close_session()
+    response_cache.close()
+
+
 def main():
     """启动 Bot"""
     if not BOT_TOKEN:
@@ -67,6 +76,7 @@ def main():
         ApplicationBuilder()
         .token(BOT_TOKEN)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -0,0 +1,110 @@
+"""
+API 响应持久化缓存（SQLite）
+按 (kind, key) 保存 JSON 响应，每类数据单独设置有效期；404 以空值缓存（负缓存）；
+条目数超过上限时先删过期条目，再删最早过期的条目。
+读写在线程池中执行，不阻塞事件循环。
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import CACHE_PATH, CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+MISS = object()
+
+
+class ResponseCache:
+    """SQLite 响应缓存：单个长连接（加锁串行使用），读操作不写库"""
+
+    EVICT_CHECK_EVERY = 200  # 每写入多少次检查一次容量
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS api_cache (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache(expires_at);
+            ''')
+            self._conn = conn
+        return self._conn
+
+    async def get(self, kind: str, key: str):
+        """返回缓存值；负缓存返回 None；未命中或已过期返回 MISS"""
+        return await asyncio.to_thread(self._get, kind, key)
+
+    async def set(self, kind: str, key: str, value, ttl: float):
+        """写入缓存；value 为 None 表示负缓存"""
+        if ttl > 0:
+            await asyncio.to_thread(self._set, kind, key, value, ttl)
+
+    def _get(self, kind: str, key: str):
+        try:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT value, expires_at FROM api_cache WHERE kind = ? AND key = ?", (kind, key)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("读取缓存失败 %s/%s: %s", kind, key, e)
+            return MISS
+        if not row or row[1] <= time.time():
+            return MISS
+        return None if row[0] is None else json.loads(row[0])
+
+    def _set(self, kind: str, key: str, value, ttl: float):
+        data = None if value is None else json.dumps(value, ensure_ascii=False)
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO api_cache (kind, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (kind, key, data, time.time() + ttl)
+                )
+                conn.commit()
+                self._writes += 1
+                if self._writes % self.EVICT_CHECK_EVERY == 0:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning("写入缓存失败 %s/%s: %s", kind, key, e)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """删除过期条目，仍超过上限时按过期时间从早到晚删除（调用方持有锁）"""
+        conn.execute("DELETE FROM api_cache WHERE expires_at <= ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                """DELETE FROM api_cache WHERE (kind, key) IN (
+                       SELECT kind, key FROM api_cache ORDER BY expires_at LIMIT ?)""",
+                (count - self.max_entries,)
+            )
+        conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+response_cache = ResponseCache(CACHE_PATH, CACHE_MAX_ENTRIES)
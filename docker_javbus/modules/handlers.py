@@ -15,6 +15,8 @@ from modules.javbus_api import (
     get_all_movie_ids_by_filter,
     search_all_movie_ids,
     get_magnets_for_movie_list,
+    get_magnets_by_filter,
+    get_magnets_by_search,
 )
 # 详情类命令从 info_handlers 导入，供 re-export
 from modules.info_handlers import movie_command, star_command, codes_command  # noqa: F401
@@ -32,7 +34,11 @@ _search_result_messages: dict[int, tuple[list[str], str]] = {}
 # ==================== 任务队列 ====================
 
 class _TaskQueue:
-    """每个 chat_id 一个 FIFO 队列，收集任务串行执行，bot 保持响应"""
+    """每个 chat_id 一个 FIFO 队列，收集任务串行执行，bot 保持响应
+
+    跨聊天的并发上限（MAX_ACTIVE_TASKS）由收集本身占用名额（见 javbus_api），
+    加入其他聊天进行中的相同收集时无需等待名额。
+    """
 
     def __init__(self):
         self._queues: dict[int, asyncio.Queue] = {}
@@ -259,52 +265,43 @@ async def jav_star_command(update: Update, context: ContextTypes):
     star_id = context.args[0]
     chat_id = update.effective_chat.id
 
+    desc = f"jav_star {star_id}"
+    queued = task_queue.queue_size(chat_id)
     status_msg = await update.message.reply_text(
+        f"📋 演员 <code>{html_escape(star_id)}</code> 的任务已加入队列（前面还有 {queued + 1} 个任务）..."
+        if task_queue.is_running(chat_id) else
         f"🔍 正在获取演员 <code>{html_escape(star_id)}</code> 的影片列表...",
         parse_mode="HTML"
     )
 
-    movie_ids = await get_all_movie_ids_by_filter("star", star_id)
-    if not movie_ids:
-        await update.message.reply_text(
-            f"❌ 未找到演员 <code>{html_escape(star_id)}</code> 的影片",
-            parse_mode="HTML"
-        )
-        return
-
-    total = len(movie_ids)
-    desc = f"jav_star {star_id} ({total}部)"
-    queued = task_queue.queue_size(chat_id)
-    await status_msg.edit_text(
-        f"📋 找到 <b>{total}</b> 部影片"
-        + (f"，排队中（前面还有 {queued + 1} 个任务）..." if task_queue.is_running(chat_id) else "，正在收集磁力链接..."),
-        parse_mode="HTML"
-    )
-
     async def _do_collect():
         cancel_event = _get_cancel_event(chat_id)
-        await status_msg.edit_text(
-            f"📋 共 {total} 部影片，正在逐个收集磁力链接...\n磁力链接收集: <b>0/{total}</b>",
-            parse_mode="HTML"
-        )
 
+        # 边翻页边收集：进度中的总数随翻页增长
         async def _progress(done, total):
             if cancel_event.is_set():
                 return
             try:
                 await status_msg.edit_text(
-                    f"📋 共 {total} 部影片，正在逐个收集磁力链接...\n磁力链接收集: <b>{done}/{total}</b>",
+                    f"📋 已找到 {total} 部影片，正在逐个收集磁力链接...\n磁力链接收集: <b>{done}/{total}</b>",
                     parse_mode="HTML"
                 )
             except Exception:
                 pass
 
-        results = await get_magnets_for_movie_list(
-            movie_ids, progress_callback=_progress, cancel_event=cancel_event
+        results, total = await get_magnets_by_filter(
+            "star", star_id, progress_callback=_progress, cancel_event=cancel_event
         )
         if cancel_event.is_set():
             await context.bot.send_message(chat_id=chat_id, text="⏹ 任务已停止")
             return
+        if not total:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=f"❌ 未找到演员 <code>{html_escape(star_id)}</code> 的影片",
+                parse_mode="HTML"
+            )
+            return
         if not results:
             await context.bot.send_message(chat_id=chat_id, text="❌ 未能获取到磁力链接")
             return
@@ -646,17 +643,9 @@ async def button_callback(update: Update, context: ContextTypes):
             logger.info("button_callback: chat_id=%s, 暂存中有 %d 个影片ID", chat_id, len(movie_ids) if movie_ids else 0)
 
             if not movie_ids:
-                # 暂存数据不存在（bot 重启等），回退到重新搜索
+                # 暂存数据不存在（bot 重启等），回退到重新搜索（在任务中边翻页边收集）
                 logger.warning("button_callback: 暂存为空，回退重新搜索 action=%s param=%s", action, param)
-                if action == "filter":
-                    filter_type, filter_value = param.split(":", 1)
-                    movie_ids = await get_all_movie_ids_by_filter(filter_type, filter_value)
-                elif action == "search":
-                    movie_ids = await search_all_movie_ids(param)
-
-                if not movie_ids:
-                    await query.message.reply_text("❌ 未找到影片，请重新使用 /jav_filter 或 /jav_search 搜索")
-                    return
+                movie_ids = []
 
             if action == "filter":
                 filter_type, filter_value = param.split(":", 1)
@@ -665,7 +654,7 @@ async def button_callback(update: Update, context: ContextTypes):
                 file_prefix = f"search_{param}"
 
             total = len(movie_ids)
-            desc = f"{action}:{param} ({total}部)"
+            desc = f"{action}:{param} ({total}部)" if total else f"{action}:{param}"
             queued = task_queue.queue_size(chat_id)
             if task_queue.is_running(chat_id):
                 await query.message.reply_text(
@@ -673,7 +662,7 @@ async def button_callback(update: Update, context: ContextTypes):
                 )
 
             async def _do_collect():
-                await _collect_magnets_with_ids(query, context, movie_ids, file_prefix, chat_id)
+                await _collect_magnets_with_ids(query, context, movie_ids, file_prefix, chat_id, (action, param))
 
             await task_queue.submit(chat_id, context.bot, _do_collect, desc)
             return
@@ -686,13 +675,17 @@ async def button_callback(update: Update, context: ContextTypes):
             pass
 
 
-async def _collect_magnets_with_ids(query, context, movie_ids, file_prefix, chat_id):
-    """使用已有的影片 ID 列表直接收集磁力链接（由任务队列调用）"""
+async def _collect_magnets_with_ids(query, context, movie_ids, file_prefix, chat_id, search=None):
+    """收集磁力链接（由任务队列调用）
+
+    movie_ids 为已有的影片 ID 列表；为空时按 search=(action, param) 重新搜索，边翻页边收集。
+    """
     cancel_event = _get_cancel_event(chat_id)
     total = len(movie_ids)
     status_msg = await query.message.reply_text(
         f"📋 共 <b>{total}</b> 部影片，正在逐个收集磁力链接...\n"
-        f"磁力链接收集: <b>0/{total}</b>",
+        f"磁力链接收集: <b>0/{total}</b>"
+        if total else "🔍 正在重新搜索影片并收集磁力链接...",
         parse_mode="HTML"
     )
 
@@ -709,9 +702,24 @@ async def _collect_magnets_with_ids(query, context, movie_ids, file_prefix, chat
             pass
 
     try:
-        results = await get_magnets_for_movie_list(
-            movie_ids, progress_callback=_progress, cancel_event=cancel_event
-        )
+        if movie_ids:
+            results = await get_magnets_for_movie_list(
+                movie_ids, progress_callback=_progress, cancel_event=cancel_event
+            )
+        else:
+            action, param = search
+            if action == "filter":
+                filter_type, filter_value = param.split(":", 1)
+                results, total = await get_magnets_by_filter(
+                    filter_type, filter_value, progress_callback=_progress, cancel_event=cancel_event
+                )
+            else:
+                results, total = await get_magnets_by_search(
+                    param, progress_callback=_progress, cancel_event=cancel_event
+                )
+            if not total and not cancel_event.is_set():
+                await query.message.reply_text("❌ 未找到影片，请重新使用 /jav_filter 或 /jav_search 搜索")
+                return
     except Exception as e:
         logger.error("收集磁力链接异常: %s", e, exc_info=True)
         await context.bot.send_message(chat_id=chat_id, text=f"❌ 收集磁力链接时出错: {e}")
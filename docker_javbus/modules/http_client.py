@@ -0,0 +1,45 @@
+"""
+应用级共享 HTTP 会话
+Bot 启动时（post_init）创建，退出时关闭；所有请求复用同一个连接池，避免每个命令重新建立 TCP/TLS 连接。
+会话不带默认请求头，API 认证头由调用方按请求传入（封面/头像等第三方地址不会收到 Token）。
+"""
+import logging
+import aiohttp
+from config import HTTP_POOL_SIZE, HTTP_POOL_PER_HOST, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_session: aiohttp.ClientSession | None = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE,
+        limit_per_host=HTTP_POOL_PER_HOST,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def start_session():
+    """创建共享会话（post_init 中调用）"""
+    get_session()
+    logger.info("HTTP 会话已创建 (limit=%d, per_host=%d)", HTTP_POOL_SIZE, HTTP_POOL_PER_HOST)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """获取共享会话；尚未创建或已关闭时新建（须在事件循环中调用）"""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_session():
+    """关闭共享会话（post_shutdown 中调用）"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -3,7 +3,6 @@
 """
 import io
 import logging
-import aiohttp
 from html import escape as html_escape
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -14,6 +13,7 @@ from modules.javbus_api import (
     get_star_info,
     get_star_movie_list,
 )
+from modules.http_client import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -83,20 +83,19 @@ async def movie_command(update: Update, context: ContextTypes):
     if img_url:
         cover_url = img_url.replace('/thumb/', '/cover/').replace('.jpg', '_b.jpg')
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(cover_url) as resp:
-                    if resp.status == 200:
-                        img_data = io.BytesIO(await resp.read())
-                        img_data.seek(0)
-                        caption = "\n".join(lines[:8])
-                        if len(caption) > 1024:
-                            caption = caption[:1020] + "..."
-                        await update.message.reply_photo(
-                            photo=img_data,
-                            caption=caption,
-                            parse_mode="HTML"
-                        )
-                        return
+            async with get_session().get(cover_url) as resp:
+                if resp.status == 200:
+                    img_data = io.BytesIO(await resp.read())
+                    img_data.seek(0)
+                    caption = "\n".join(lines[:8])
+                    if len(caption) > 1024:
+                        caption = caption[:1020] + "..."
+                    await update.message.reply_photo(
+                        photo=img_data,
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+                    return
         except Exception as e:
             logger.warning("发送封面图失败: %s", e)
 
@@ -123,13 +122,7 @@ async def star_command(update: Update, context: ContextTypes):
         parse_mode="HTML"
     )
 
-    headers = {}
-    from config import JAVBUS_AUTH_TOKEN
-    if JAVBUS_AUTH_TOKEN:
-        headers['j-auth-token'] = JAVBUS_AUTH_TOKEN
-
-    async with aiohttp.ClientSession(headers=headers) as session:
-        info = await get_star_info(session, star_id)
+    info = await get_star_info(star_id)
 
     if not info:
         await update.message.reply_text(
@@ -162,20 +155,19 @@ async def star_command(update: Update, context: ContextTypes):
     avatar_url = info.get('avatar', '')
     if avatar_url:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(avatar_url) as resp:
-                    if resp.status == 200:
-                        img_data = io.BytesIO(await resp.read())
-                        img_data.seek(0)
-                        caption = "\n".join(lines)
-                        if len(caption) > 1024:
-                            caption = caption[:1020] + "..."
-                        await update.message.reply_photo(
-                            photo=img_data,
-                            caption=caption,
-                            parse_mode="HTML"
-                        )
-                        return
+            async with get_session().get(avatar_url) as resp:
+                if resp.status == 200:
+                    img_data = io.BytesIO(await resp.read())
+                    img_data.seek(0)
+                    caption = "\n".join(lines)
+                    if len(caption) > 1024:
+                        caption = caption[:1020] + "..."
+                    await update.message.reply_photo(
+                        photo=img_data,
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+                    return
         except Exception as e:
             logger.warning("发送头像失败: %s", e)
 
@@ -4,41 +4,29 @@ JavBus API 客户端封装
 """
 import asyncio
 import logging
+import random
 import time
 import aiohttp
 from config import (
     JAVBUS_API_URL, JAVBUS_AUTH_TOKEN, DEFAULT_TYPE,
-    MAGNET_SORT_BY, MAGNET_SORT_ORDER, MAX_CONCURRENT, MAX_PAGES,
-    RATE_LIMIT
+    MAGNET_SORT_BY, MAGNET_SORT_ORDER, MAX_ACTIVE_TASKS, MAX_CONCURRENT, MAX_PAGES, PIPELINE_QUEUE_SIZE,
+    RATE_LIMIT, RATE_BURST, RATE_LIMIT_LIST, RATE_LIMIT_DETAIL, RATE_LIMIT_MAGNETS,
+    CACHE_DETAIL_TTL, CACHE_MAGNET_TTL, CACHE_NEGATIVE_TTL, HTTP_RETRIES, HTTP_RETRY_BACKOFF
 )
+from modules.cache import response_cache, MISS
+from modules.http_client import get_session
+from modules.rate_limiter import RateLimiter
+from modules.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 
-class _RateLimiter:
-    """滑动窗口限速器：允许突发请求，保证每分钟不超过 N 次"""
-    def __init__(self, max_per_minute: int):
-        self._max = max_per_minute
-        self._lock = asyncio.Lock()
-        self._timestamps: list[float] = []
-
-    async def acquire(self):
-        async with self._lock:
-            now = time.monotonic()
-            # 清理超过60秒的记录
-            self._timestamps = [t for t in self._timestamps if now - t < 60]
-            if len(self._timestamps) >= self._max:
-                # 等到最早的请求过期
-                wait = 60.0 - (now - self._timestamps[0]) + 0.1
-                if wait > 0:
-                    await asyncio.sleep(wait)
-                now = time.monotonic()
-                self._timestamps = [t for t in self._timestamps if now - t < 60]
-            self._timestamps.append(time.monotonic())
-
-
-# 全局限速器实例
-_rate_limiter = _RateLimiter(RATE_LIMIT)
+# 全局限速器实例：全局额度 + 列表/详情/磁力三类接口各自的额度（0 表示只受全局额度限制）
+_rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST, {
+    "list": (RATE_LIMIT_LIST, RATE_BURST),
+    "detail": (RATE_LIMIT_DETAIL, RATE_BURST),
+    "magnets": (RATE_LIMIT_MAGNETS, RATE_BURST),
+})
 
 
 def _get_headers():
@@ -49,101 +37,120 @@ def _get_headers():
     return headers
 
 
-async def get_movie_detail(session, movie_id):
-    """获取影片详情 /api/movies/{movieId}"""
-    await _rate_limiter.acquire()
-    url = f"{JAVBUS_API_URL}/api/movies/{movie_id}"
+class _ApiError(Exception):
+    """API 请求失败（重试后仍为网络错误或超时）"""
+
+
+async def _api_get(path, params=None, budget=None):
+    """限速 GET 请求 API，返回 (HTTP 状态码, JSON 数据或 None)
+
+    budget 为占用的命名额度（list / detail / magnets）；使用共享会话；5xx 和网络错误/超时按指数退避加随机抖动重试 HTTP_RETRIES 次，每次重试同样计入限速。
+    """
+    url = f"{JAVBUS_API_URL}{path}"
+    for attempt in range(HTTP_RETRIES + 1):
+        await _rate_limiter.acquire(budget)
+        try:
+            async with get_session().get(url, params=params, headers=_get_headers()) as resp:
+                if resp.status < 500 or attempt >= HTTP_RETRIES:
+                    return resp.status, (await resp.json() if resp.status == 200 else None)
+                logger.warning("请求 %s 返回 HTTP %s，准备重试 (%d/%d)", path, resp.status, attempt + 1, HTTP_RETRIES)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= HTTP_RETRIES:
+                raise _ApiError(f"{type(e).__name__}: {e}") from e
+            logger.warning("请求 %s 异常 %s，准备重试 (%d/%d)", path, type(e).__name__, attempt + 1, HTTP_RETRIES)
+        await asyncio.sleep(random.uniform(0, HTTP_RETRY_BACKOFF * 2 ** attempt))
+
+
+async def get_movie_detail(movie_id):
+    """获取影片详情 /api/movies/{movieId}（优先读缓存）"""
+    cached = await response_cache.get("detail", movie_id)
+    if cached is not MISS:
+        return cached
     try:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            logger.error("获取影片详情失败 %s: HTTP %s", movie_id, resp.status)
-            return None
-    except aiohttp.ClientError as e:
+        status, detail = await _api_get(f"/api/movies/{movie_id}", budget="detail")
+    except (aiohttp.ClientError, _ApiError) as e:
         logger.error("请求影片详情异常 %s: %s", movie_id, e)
         return None
-
-
-async def get_magnets(session, movie_id, gid, uc):
-    """获取影片磁力链接 /api/magnets/{movieId}"""
-    await _rate_limiter.acquire()
-    url = f"{JAVBUS_API_URL}/api/magnets/{movie_id}"
+    if status == 200:
+        await response_cache.set("detail", movie_id, detail, CACHE_DETAIL_TTL)
+        return detail
+    if status == 404:
+        await response_cache.set("detail", movie_id, None, CACHE_NEGATIVE_TTL)
+    logger.error("获取影片详情失败 %s: HTTP %s", movie_id, status)
+    return None
+
+
+async def get_magnets(movie_id, gid, uc):
+    """获取影片磁力链接 /api/magnets/{movieId}（优先读缓存）"""
+    # 排序方式会影响返回顺序，一并作为缓存键
+    cache_key = f"{movie_id}|{gid}|{uc}|{MAGNET_SORT_BY}|{MAGNET_SORT_ORDER}"
+    cached = await response_cache.get("magnets", cache_key)
+    if cached is not MISS:
+        return cached
     params = {"gid": gid, "uc": uc}
     if MAGNET_SORT_BY:
         params["sortBy"] = MAGNET_SORT_BY
     if MAGNET_SORT_ORDER:
         params["sortOrder"] = MAGNET_SORT_ORDER
     try:
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            logger.error("获取磁力链接失败 %s: HTTP %s", movie_id, resp.status)
-            return None
-    except aiohttp.ClientError as e:
+        status, magnets = await _api_get(f"/api/magnets/{movie_id}", params, budget="magnets")
+    except (aiohttp.ClientError, _ApiError) as e:
         logger.error("请求磁力链接异常 %s: %s", movie_id, e)
         return None
+    if status == 200:
+        await response_cache.set("magnets", cache_key, magnets, CACHE_MAGNET_TTL)
+        return magnets
+    if status == 404:
+        await response_cache.set("magnets", cache_key, None, CACHE_NEGATIVE_TTL)
+    logger.error("获取磁力链接失败 %s: HTTP %s", movie_id, status)
+    return None
 
 
-async def get_star_info(session, star_id):
+async def get_star_info(star_id):
     """获取演员详情 /api/stars/{starId}"""
-    await _rate_limiter.acquire()
-    url = f"{JAVBUS_API_URL}/api/stars/{star_id}"
     params = {}
     if DEFAULT_TYPE:
         params["type"] = DEFAULT_TYPE
     try:
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            logger.error("获取演员详情失败 %s: HTTP %s", star_id, resp.status)
-            return None
-    except aiohttp.ClientError as e:
+        status, info = await _api_get(f"/api/stars/{star_id}", params, budget="detail")
+    except (aiohttp.ClientError, _ApiError) as e:
         logger.error("请求演员详情异常 %s: %s", star_id, e)
         return None
+    if status == 200:
+        return info
+    logger.error("获取演员详情失败 %s: HTTP %s", star_id, status)
+    return None
 
 
-async def _get_movie_ids_page(session, params, page):
-    """获取单页影片列表，返回 (movie_ids, has_next_page)"""
-    await _rate_limiter.acquire()
-    params = {**params, "page": str(page)}
-    url = f"{JAVBUS_API_URL}/api/movies"
+async def _get_movies_page(path, params, page):
+    """获取单页影片列表，返回 (movies, has_next_page)；失败返回 ([], False)"""
     try:
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                movie_ids = [m['id'] for m in data.get('movies', [])]
-                has_next = data.get('pagination', {}).get('hasNextPage', False)
-                return movie_ids, has_next
-            logger.error("获取影片列表失败: HTTP %s", resp.status)
-            return [], False
-    except aiohttp.ClientError as e:
-        logger.error("请求影片列表异常: %s", e)
+        status, data = await _api_get(path, {**params, "page": str(page)}, budget="list")
+    except (aiohttp.ClientError, _ApiError) as e:
+        logger.error("请求影片列表异常 %s: %s", path, e)
+        return [], False
+    if status != 200:
+        logger.error("获取影片列表失败 %s: HTTP %s", path, status)
         return [], False
+    return data.get('movies', []), data.get('pagination', {}).get('hasNextPage', False)
 
 
-async def _search_movie_ids_page(session, keyword, page):
+async def _get_movie_ids_page(params, page):
+    """获取单页影片列表，返回 (movie_ids, has_next_page)"""
+    movies, has_next = await _get_movies_page("/api/movies", params, page)
+    return [m['id'] for m in movies], has_next
+
+
+async def _search_movie_ids_page(keyword, page):
     """搜索影片单页，返回 (movie_ids, has_next_page)"""
-    await _rate_limiter.acquire()
-    url = f"{JAVBUS_API_URL}/api/movies/search"
-    params = {"keyword": keyword, "page": str(page), "magnet": "exist"}
+    params = {"keyword": keyword, "magnet": "exist"}
     if DEFAULT_TYPE:
         params["type"] = DEFAULT_TYPE
-    try:
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                movie_ids = [m['id'] for m in data.get('movies', [])]
-                has_next = data.get('pagination', {}).get('hasNextPage', False)
-                return movie_ids, has_next
-            logger.error("搜索影片失败: HTTP %s", resp.status)
-            return [], False
-    except aiohttp.ClientError as e:
-        logger.error("搜索影片异常: %s", e)
-        return [], False
+    movies, has_next = await _get_movies_page("/api/movies/search", params, page)
+    return [m['id'] for m in movies], has_next
 
 
-async def get_all_movie_ids_by_filter(filter_type, filter_value):
-    """按筛选条件获取所有影片 ID（自动翻页）"""
+def _filter_params(filter_type, filter_value):
     params = {
         "filterType": filter_type,
         "filterValue": filter_value,
@@ -151,58 +158,68 @@ async def get_all_movie_ids_by_filter(filter_type, filter_value):
     }
     if DEFAULT_TYPE:
         params["type"] = DEFAULT_TYPE
+    return params
+
+
+async def _iter_pages(fetch_page):
+    """逐页获取影片 ID（最多 MAX_PAGES 页），每页 yield 一次 ID 列表"""
+    page = 1
+    while page <= MAX_PAGES:
+        ids, has_next = await fetch_page(page)
+        if ids:
+            yield ids
+        if not has_next or not ids:
+            break
+        page += 1
+
+
+def _filter_pages(filter_type, filter_value):
+    params = _filter_params(filter_type, filter_value)
+    return _iter_pages(lambda page: _get_movie_ids_page(params, page))
+
+
+def _search_pages(keyword):
+    return _iter_pages(lambda page: _search_movie_ids_page(keyword, page))
+
 
+async def get_all_movie_ids_by_filter(filter_type, filter_value):
+    """按筛选条件获取所有影片 ID（自动翻页）"""
     all_ids = []
-    headers = _get_headers()
-    async with aiohttp.ClientSession(headers=headers) as session:
-        page = 1
-        while page <= MAX_PAGES:
-            ids, has_next = await _get_movie_ids_page(session, params, page)
-            all_ids.extend(ids)
-            if not has_next or not ids:
-                break
-            page += 1
+    async for ids in _filter_pages(filter_type, filter_value):
+        all_ids.extend(ids)
     return all_ids
 
 
 async def search_all_movie_ids(keyword):
     """搜索获取所有影片 ID（自动翻页）"""
     all_ids = []
-    headers = _get_headers()
-    async with aiohttp.ClientSession(headers=headers) as session:
-        page = 1
-        while page <= MAX_PAGES:
-            ids, has_next = await _search_movie_ids_page(session, keyword, page)
-            all_ids.extend(ids)
-            if not has_next or not ids:
-                break
-            page += 1
+    async for ids in _search_pages(keyword):
+        all_ids.extend(ids)
     return all_ids
 
 
-async def _fetch_magnet_for_movie(session, movie_id, semaphore):
+async def _fetch_magnet_for_movie(movie_id):
     """获取单个影片的最大磁力链接"""
-    async with semaphore:
-        detail = await get_movie_detail(session, movie_id)
-        if not detail:
-            return None
-        gid = detail.get("gid", "")
-        uc = detail.get("uc", "")
-        if not gid:
-            return None
-        magnets = await get_magnets(session, movie_id, gid, uc)
-        if not magnets:
-            return None
-        # 取最大的磁力链接
-        max_magnet = max(magnets, key=lambda x: x.get('numberSize', 0) or 0)
-        return {
-            "id": movie_id,
-            "title": detail.get("title", ""),
-            "link": max_magnet.get("link", ""),
-            "size": max_magnet.get("size", ""),
-            "isHD": max_magnet.get("isHD", False),
-            "hasSubtitle": max_magnet.get("hasSubtitle", False),
-        }
+    detail = await get_movie_detail(movie_id)
+    if not detail:
+        return None
+    gid = detail.get("gid", "")
+    uc = detail.get("uc", "")
+    if not gid:
+        return None
+    magnets = await get_magnets(movie_id, gid, uc)
+    if not magnets:
+        return None
+    # 取最大的磁力链接
+    max_magnet = max(magnets, key=lambda x: x.get('numberSize', 0) or 0)
+    return {
+        "id": movie_id,
+        "title": detail.get("title", ""),
+        "link": max_magnet.get("link", ""),
+        "size": max_magnet.get("size", ""),
+        "isHD": max_magnet.get("isHD", False),
+        "hasSubtitle": max_magnet.get("hasSubtitle", False),
+    }
 
 
 class _Cancelled(Exception):
@@ -210,96 +227,151 @@ class _Cancelled(Exception):
     pass
 
 
-async def get_magnets_for_movie_list(movie_ids, progress_callback=None, cancel_event=None):
-    """批量获取影片的最大磁力链接，支持进度回调和取消"""
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-    headers = _get_headers()
-    total = len(movie_ids)
-    results = []
+async def _collect_magnets(pages, progress_callback=None, cancel_event=None):
+    """流水线收集磁力：翻页结果写入有界队列，MAX_CONCURRENT 个 worker 同时取出获取磁力
+
+    pages 为逐页产出影片 ID 列表的异步迭代器；翻页与磁力获取并行，队列满时翻页暂停，
+    内存占用由 PIPELINE_QUEUE_SIZE 决定而不是影片总数。
+    progress_callback(已完成数, 已发现数)；返回 (按发现顺序排列的结果, 影片总数)，取消时结果为空。
+    """
+    queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    results = {}
+    discovered = 0
     completed_count = 0
+    listing_done = False
     last_progress_time = 0  # 上次更新进度的时间戳
 
-    async def _fetch_with_progress(session, movie_id):
+    def _cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    async def _producer():
+        nonlocal discovered, listing_done
+        try:
+            async for ids in pages:
+                for movie_id in ids:
+                    if _cancelled():
+                        return
+                    await queue.put((discovered, movie_id))
+                    discovered += 1
+        finally:
+            listing_done = True
+            # 每个 worker 一个结束标记；worker 在取消后仍会继续取出队列，这里不会永久阻塞
+            for _ in range(MAX_CONCURRENT):
+                await queue.put(None)
+
+    async def _worker():
         nonlocal completed_count, last_progress_time
-        if cancel_event and cancel_event.is_set():
-            return None
-        result = await _fetch_magnet_for_movie(session, movie_id, semaphore)
-        completed_count += 1
-        if cancel_event and cancel_event.is_set():
-            return None
-        # 每5个或每3秒更新一次进度，避免 Telegram API 频率限制
-        now = time.monotonic()
-        if progress_callback and (completed_count % 5 == 0 or completed_count == total or now - last_progress_time >= 3.0):
-            last_progress_time = now
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if _cancelled():
+                continue
+            idx, movie_id = item
             try:
-                await progress_callback(completed_count, total)
-            except Exception:
-                pass
-        return result
-
-    async with aiohttp.ClientSession(headers=headers) as session:
-        tasks = [_fetch_with_progress(session, mid) for mid in movie_ids]
-        completed = await asyncio.gather(*tasks)
-        # 如果被取消，返回空列表
-        if cancel_event and cancel_event.is_set():
-            return []
-        results = [r for r in completed if r is not None]
+                result = await _fetch_magnet_for_movie(movie_id)
+            except Exception as e:
+                logger.error("获取磁力异常 %s: %s", movie_id, e)
+                result = None
+            completed_count += 1
+            if result is not None:
+                results[idx] = result
+            if _cancelled():
+                continue
+            # 每5个或每3秒更新一次进度，避免 Telegram API 频率限制
+            now = time.monotonic()
+            finished = listing_done and completed_count == discovered
+            if progress_callback and (completed_count % 5 == 0 or finished or now - last_progress_time >= 3.0):
+                last_progress_time = now
+                try:
+                    await progress_callback(completed_count, discovered)
+                except Exception:
+                    pass
+
+    await asyncio.gather(_producer(), *(_worker() for _ in range(MAX_CONCURRENT)))
+    logger.info("磁力收集结束: %d/%d，限速统计: %s", completed_count, discovered, _rate_limiter.stats())
+    if _cancelled():
+        return [], discovered
+    return [results[i] for i in sorted(results)], discovered
+
+
+# 进行中的相同收集任务合并执行；key 含筛选类型、值和影响结果的选项
+_collections = SingleFlight()
+_COLLECT_OPTIONS = (DEFAULT_TYPE, MAGNET_SORT_BY, MAGNET_SORT_ORDER)
+# 所有聊天同时执行的收集数上限；名额由实际执行的收集占用，加入进行中收集的请求者不占名额
+_collect_slots = asyncio.Semaphore(MAX_ACTIVE_TASKS)
+
+
+async def _collect_with_slot(pages_factory, progress_callback, cancel_event):
+    async with _collect_slots:
+        # 等待执行名额期间所有请求者可能都已取消
+        if cancel_event.is_set():
+            return [], 0
+        return await _collect_magnets(pages_factory(), progress_callback, cancel_event)
+
+
+async def _collect_shared(key, pages_factory, progress_callback, cancel_event):
+    """与其他请求者共享同一次收集，返回 (结果, 影片总数)；本请求被取消时返回 ([], 0)"""
+    shared = await _collections.run(
+        key + _COLLECT_OPTIONS,
+        lambda progress, cancel: _collect_with_slot(pages_factory, progress, cancel),
+        progress_callback, cancel_event
+    )
+    return shared if shared is not None else ([], 0)
+
+
+async def get_magnets_for_movie_list(movie_ids, progress_callback=None, cancel_event=None):
+    """批量获取影片的最大磁力链接，支持进度回调和取消"""
+    async def _pages():
+        yield movie_ids
+
+    results, _ = await _collect_shared(("ids", tuple(movie_ids)), _pages, progress_callback, cancel_event)
     return results
 
 
+async def get_magnets_by_filter(filter_type, filter_value, progress_callback=None, cancel_event=None):
+    """按筛选条件边翻页边收集磁力链接，返回 (结果, 影片总数)"""
+    return await _collect_shared(
+        ("filter", filter_type, filter_value), lambda: _filter_pages(filter_type, filter_value),
+        progress_callback, cancel_event
+    )
+
+
+async def get_magnets_by_search(keyword, progress_callback=None, cancel_event=None):
+    """按关键词边翻页边收集磁力链接，返回 (结果, 影片总数)"""
+    return await _collect_shared(
+        ("search", keyword), lambda: _search_pages(keyword), progress_callback, cancel_event
+    )
+
+
 async def get_star_movie_list(star_id):
     """获取女优的影片列表（番号+基本信息，不获取磁力）"""
-    params = {
-        "filterType": "star",
-        "filterValue": star_id,
-        "magnet": "exist"
-    }
-    if DEFAULT_TYPE:
-        params["type"] = DEFAULT_TYPE
-
+    params = _filter_params("star", star_id)
     all_movies = []
-    headers = _get_headers()
-    async with aiohttp.ClientSession(headers=headers) as session:
-        page = 1
-        while page <= MAX_PAGES:
-            await _rate_limiter.acquire()
-            req_params = {**params, "page": str(page)}
-            url = f"{JAVBUS_API_URL}/api/movies"
-            try:
-                async with session.get(url, params=req_params) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        movies = data.get('movies', [])
-                        has_next = data.get('pagination', {}).get('hasNextPage', False)
-                        for m in movies:
-                            all_movies.append({
-                                "id": m.get("id", ""),
-                                "title": m.get("title", ""),
-                                "date": m.get("date", ""),
-                                "img": m.get("img", ""),
-                            })
-                        if not has_next or not movies:
-                            break
-                    else:
-                        logger.error("获取女优影片列表失败: HTTP %s", resp.status)
-                        break
-            except aiohttp.ClientError as e:
-                logger.error("请求女优影片列表异常: %s", e)
-                break
-            page += 1
+    page = 1
+    while page <= MAX_PAGES:
+        movies, has_next = await _get_movies_page("/api/movies", params, page)
+        for m in movies:
+            all_movies.append({
+                "id": m.get("id", ""),
+                "title": m.get("title", ""),
+                "date": m.get("date", ""),
+                "img": m.get("img", ""),
+            })
+        if not has_next or not movies:
+            break
+        page += 1
     return all_movies
 
 
 async def get_single_movie_magnet(movie_id):
     """获取单个影片的详情和磁力链接"""
-    headers = _get_headers()
-    async with aiohttp.ClientSession(headers=headers) as session:
-        detail = await get_movie_detail(session, movie_id)
-        if not detail:
-            return None
-        gid = detail.get("gid", "")
-        uc = detail.get("uc", "")
-        if not gid:
-            return {"detail": detail, "magnets": []}
-        magnets = await get_magnets(session, movie_id, gid, uc)
-        return {"detail": detail, "magnets": magnets or []}
\ No newline at end of file
+    detail = await get_movie_detail(movie_id)
+    if not detail:
+        return None
+    gid = detail.get("gid", "")
+    uc = detail.get("uc", "")
+    if not gid:
+        return {"detail": detail, "magnets": []}
+    magnets = await get_magnets(movie_id, gid, uc)
+    return {"detail": detail, "magnets": magnets or []}
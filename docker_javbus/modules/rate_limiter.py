@@ -0,0 +1,90 @@
+"""
+API 请求限速器（GCRA）
+每个额度只保存一个"理论到达时间"，acquire 为 O(1)；调用时立即预约时间片，
+先调用者先得到时间片（FIFO），等待期间不持有锁，额度释放后各等待者按预约时刻依次醒来。
+一次请求占用多个额度时，放行时刻取各额度最早可放行时刻中的最大值，并在该时刻同时预约所有额度。
+"""
+import asyncio
+import time
+
+
+class GcraBucket:
+    """单个额度：每分钟 rate 次，最多连续突发 burst 次；rate 为 0 表示不限速"""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int = 1):
+        self.name = name
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.tolerance = max(burst - 1, 0) * self.interval
+        self._tat = 0.0  # 理论到达时间（theoretical arrival time）
+        # 统计
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def allowed_at(self, now: float) -> float:
+        """最早可放行的时刻"""
+        if not self.interval:
+            return now
+        return max(self._tat - self.tolerance, now)
+
+    def reserve(self, at: float) -> tuple[float, float]:
+        """在 at 时刻（不早于 allowed_at）占用一个时间片，返回 (预约前, 预约后) 的理论到达时间"""
+        prev = self._tat
+        if self.interval:
+            self._tat = max(self._tat, at) + self.interval
+        return prev, self._tat
+
+    def release(self, prev: float, tat: float):
+        """撤销最近一次预约（等待中被取消时调用，仅当其后没有新预约）"""
+        if self._tat == tat:
+            self._tat = prev
+
+    def record(self, wait: float):
+        self.acquired += 1
+        if wait > 0:
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "avg_wait": self.total_wait / self.waited if self.waited else 0.0,
+            "max_wait": self.max_wait,
+            "total_wait": self.total_wait,
+        }
+
+
+class RateLimiter:
+    """全局额度 + 按接口类型划分的命名额度；一次请求同时占用全局额度和对应的命名额度"""
+
+    def __init__(self, global_rate: float, burst: int, budgets: dict[str, tuple[float, int]] | None = None):
+        self._global = GcraBucket("global", global_rate, burst)
+        self._budgets = {name: GcraBucket(name, rate, b) for name, (rate, b) in (budgets or {}).items()}
+
+    async def acquire(self, budget: str | None = None):
+        now = time.monotonic()
+        buckets = [self._global]
+        if budget in self._budgets:
+            buckets.append(self._budgets[budget])
+        send_at = max(b.allowed_at(now) for b in buckets)
+        reservations = [b.reserve(send_at) for b in buckets]
+        delay = send_at - now
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                for b, (prev, tat) in zip(buckets, reservations):
+                    b.release(prev, tat)
+                raise
+        for b in buckets:
+            b.record(delay)
+
+    def stats(self) -> dict[str, dict]:
+        """各额度的请求数和等待时间统计"""
+        result = {"global": self._global.stats()}
+        for name, b in self._budgets.items():
+            result[name] = b.stats()
+        return result
@@ -0,0 +1,91 @@
+"""
+相同任务合并（single-flight）
+同一个 key 的任务正在执行时，后来的请求不再重新执行，而是等待并共享同一个结果；
+进度回调广播给所有请求者；某个请求者取消只会让它自己退出，全部请求者都取消后才真正停止任务。
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[..., Awaitable[None]]
+
+
+class _Flight:
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.subscribers = 0
+        self.callbacks: set[ProgressCallback] = set()
+        self.cancel_event = asyncio.Event()
+        self.last_progress = None
+
+
+class SingleFlight:
+    """按 key 合并进行中的任务"""
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def _start(self, key: Hashable, factory: Callable[[ProgressCallback, asyncio.Event], Awaitable[Any]]) -> _Flight:
+        flight = _Flight()
+
+        async def _broadcast_progress(*args):
+            flight.last_progress = args
+            for callback in list(flight.callbacks):
+                try:
+                    await callback(*args)
+                except Exception:
+                    pass
+
+        def _done(task):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            # 请求者都已离开时没有人取结果，在这里取出异常，避免 "Task exception was never retrieved"
+            if not task.cancelled() and task.exception() is not None and flight.subscribers == 0:
+                logger.warning("无请求者的合并任务异常结束: %s: %r", key, task.exception())
+
+        flight.task = asyncio.create_task(factory(_broadcast_progress, flight.cancel_event))
+        flight.task.add_done_callback(_done)
+        self._flights[key] = flight
+        return flight
+
+    async def run(self, key: Hashable, factory: Callable[[ProgressCallback, asyncio.Event], Awaitable[Any]],
+                  progress_callback: ProgressCallback | None = None,
+                  cancel_event: asyncio.Event | None = None) -> Any:
+        """执行或加入 key 对应的任务，返回任务结果；cancel_event 被设置时返回 None
+
+        factory(progress_callback, cancel_event) 返回实际执行的协程，参数为合并后的进度回调和取消事件。
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, factory)
+        else:
+            logger.info("合并进行中的相同任务: %s（共 %d 个请求者）", key, flight.subscribers + 1)
+        flight.subscribers += 1
+        if progress_callback:
+            flight.callbacks.add(progress_callback)
+            if flight.last_progress:
+                try:
+                    await progress_callback(*flight.last_progress)
+                except Exception:
+                    pass
+        try:
+            if cancel_event is None:
+                return await asyncio.shield(flight.task)
+            cancel_wait = asyncio.create_task(cancel_event.wait())
+            try:
+                await asyncio.wait({flight.task, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                cancel_wait.cancel()
+            if flight.task.done():
+                return flight.task.result()
+            return None
+        finally:
+            flight.subscribers -= 1
+            flight.callbacks.discard(progress_callback)
+            if flight.subscribers == 0 and not flight.task.done():
+                # 没有请求者了：停止任务，之后的相同请求重新开始
+                flight.cancel_event.set()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
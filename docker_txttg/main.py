@@ -14,12 +14,14 @@ from modules.handlers.handlers_file import send_random_txt, getfile, reload_comm
 from modules.handlers.handlers_vip import setvip_command, setviplevel_command
 from modules.handlers.handlers_help import help_command
 from modules.db_migrate import migrate_db
+from modules.core.file_watcher import start_file_watcher, stop_file_watcher
+from modules.core.bot_tasks import refresh_hot_list_job
 
 from telegram.request import HTTPXRequest
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 
-from modules.config.config import ADMIN_USER_ID,TOKEN,DB_PATH
+from modules.config.config import ADMIN_USER_ID,TOKEN,DB_PATH,WATCH_TXT_ROOT,HOT_REFRESH_INTERVAL
 
 # 配置 SQL 查询日志
 logging.basicConfig()
@@ -114,11 +116,20 @@ def main():
     # 注册文档处理器
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
     
-    # 设置机器人用户名
+    # 定时重建热榜
+    application.job_queue.run_repeating(refresh_hot_list_job, interval=HOT_REFRESH_INTERVAL, first=0)
+
+    # 设置机器人用户名，按需启动文件监控
     async def set_username(app):
         me = await app.bot.get_me()
         set_bot_username(me.username)
+        if WATCH_TXT_ROOT:
+            app.bot_data['file_watcher'] = start_file_watcher(app)
     application.post_init = set_username
+
+    async def on_shutdown(app):
+        stop_file_watcher(app.bot_data.get('file_watcher'))
+    application.post_shutdown = on_shutdown
     
     # 启动机器人
     application.run_polling()
@@ -18,6 +18,13 @@ TXT_EXTS = [x.strip() for x in os.getenv('TXT_EXTS', '.txt,.pdf').split(',') if
 ALLOWED_EXTENSIONS = {'.txt', '.epub', '.pdf', '.mobi'}
 # 下载目录
 DOWNLOAD_DIR = os.path.join(os.getenv('TXT_ROOT', '/app/share_folder'), 'downloaded_docs').replace('\\', '/')
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 4))  # 批量下载并发数
+DOWNLOAD_RETRIES = 3  # 单个文件下载重试次数
+DOWNLOAD_RETRY_DELAY = 2  # 重试退避基数（秒），每次重试翻倍
+DOWNLOAD_PROGRESS_INTERVAL = 5  # 下载进度消息刷新间隔（秒）
+NOTIFY_RATE = 25  # 批量通知每秒最多发送数（Telegram 全局上限约 30 条/秒）
+NOTIFY_CONCURRENCY = 10  # 批量通知并发数
+APPROVE_POINTS = 5  # 文档被收录奖励的积分
 REDEM_URL="https://t.me/iDataRiver_Bot?start=M_685017ebfaa790cf11d677bd"
 API_BASE_URL = os.getenv('IDATARIVER_API_URL', 'https://open.idatariver.com/mapi')
 API_KEY = os.getenv('IDATARIVER_API_KEY')
@@ -48,6 +55,13 @@ SS_PAGE_SIZE = 10  # 每页显示的搜索结果数量
 PAGE_SIZE = 10   # 每页显示的结果数量
 BOT_USERNAME= os.getenv('BOT_USERNAME', 'None')
 HOT_PAGE_SIZE = 10
+HOT_REFRESH_INTERVAL = int(os.getenv('HOT_REFRESH_INTERVAL', 60))  # 热榜检查重建间隔（秒）
+RELOAD_PROGRESS_INTERVAL = 5  # /reload 进度消息刷新间隔（秒）
+
+# 文件监控配置：开启后自动同步 TXT_ROOT 的变更，无需手动 /reload
+WATCH_TXT_ROOT = os.getenv('WATCH_TXT_ROOT', 'false').lower() == 'true'
+WATCH_DEBOUNCE_SECONDS = int(os.getenv('WATCH_DEBOUNCE_SECONDS', 5))  # 文件无新事件多久后入库（秒）
+WATCH_POLL_INTERVAL = int(os.getenv('WATCH_POLL_INTERVAL', 300))  # watchdog 不可用时的轮询间隔（秒）
 
 # VIP套餐配置
 VIP_DAYS = [3, 7, 30, 90, 180, 365]  # 所有有效的VIP套餐天数
@@ -2,8 +2,9 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from modules.db.orm_utils import SessionLocal
 from modules.db.orm_models import File, UploadedDocument
-from modules.db.db_utils import get_or_create_file, mark_file_sent
+from modules.db.db_utils import get_or_create_file, mark_file_sent, rebuild_hot_files
 import os
+import asyncio
 
 async def send_file_job(context: ContextTypes.DEFAULT_TYPE):
     """异步任务：发送文件"""
@@ -131,4 +132,11 @@ async def send_file_job(context: ContextTypes.DEFAULT_TYPE):
         try:
             await context.bot.delete_message(chat_id=chat_id, message_id=prep_message_id)
         except Exception:
-            pass
\ No newline at end of file
+            pass
+
+async def refresh_hot_list_job(context: ContextTypes.DEFAULT_TYPE):
+    """定时任务：有新反馈或跨天时重建热榜"""
+    try:
+        await asyncio.to_thread(rebuild_hot_files)
+    except Exception as e:
+        print(f"重建热榜失败: {e}")
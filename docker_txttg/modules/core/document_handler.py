@@ -1,21 +1,25 @@
 import os
+import time
 import asyncio
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
-from ..config.config import ADMIN_USER_ID, DOWNLOAD_DIR, ALLOWED_EXTENSIONS
+from ..config.config import ADMIN_USER_ID, DOWNLOAD_DIR, ALLOWED_EXTENSIONS, DOWNLOAD_PROGRESS_INTERVAL
 from modules.db.orm_utils import SessionLocal
 from modules.db.orm_models import UploadedDocument, File
 from .points_system import add_points  # 添加导入
-from .document_service import check_duplicate_and_save, approve_document, reject_document, approve_and_download_document, get_pending_documents, batch_approve_documents, batch_download_documents
+from .document_service import check_duplicate_and_save, approve_document, reject_document, approve_and_download_document, get_pending_documents, get_all_pending_documents, batch_approve_documents, batch_download_documents
 from .document_utils import format_document_list_message, build_pagination_keyboard
+from .notifier import send_bulk_messages
 # 允许的文件类型
 # ALLOWED_EXTENSIONS = {'.txt', '.epub', '.pdf', '.mobi'}
 # # 下载目录
 # DOWNLOAD_DIR = os.path.join(os.getenv('TXT_ROOT', '/app/share_folder'), 'downloaded_docs').replace('\\', '/')
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+NOTIFY_MAX_FILE_NAMES = 10  # 汇总通知中最多列出的文件名数量
+
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理用户上传的文档"""
     if not update.message or not update.message.document:
@@ -176,19 +180,44 @@ async def batch_approve_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text('只有管理员可以使用此命令。')
         return
     with SessionLocal() as session:
-        approved_count, approved_docs = batch_approve_documents(session, user_id)
-        if not approved_docs:
-            await update.message.reply_text('没有待审核的文档。')
+        approved_count, summaries = batch_approve_documents(session, user_id)
+    if not approved_count:
+        await update.message.reply_text('没有待审核的文档。')
+        return
+    status_message = await update.message.reply_text(
+        f'成功批准了 {approved_count} 个文档，正在通知 {len(summaries)} 位上传者...'
+    )
+    # 每位上传者只发一条汇总通知
+    messages = {}
+    for uploader_id, summary in summaries.items():
+        names = summary['file_names']
+        name_list = '\n'.join(f'《{name}》' for name in names[:NOTIFY_MAX_FILE_NAMES])
+        if len(names) > NOTIFY_MAX_FILE_NAMES:
+            name_list += f'\n...等共 {len(names)} 个文档'
+        messages[uploader_id] = (
+            f"您的 {len(names)} 个文档已被管理员收录：\n{name_list}\n"
+            f"获得{summary['points']}积分奖励！当前积分：{summary['total_points']}"
+        )
+    sent, failed = await send_bulk_messages(context.bot, messages)
+    await status_message.edit_text(
+        f'成功批准了 {approved_count} 个文档。\n已通知 {sent} 位上传者' + (f'，{failed} 位通知失败。' if failed else '。')
+    )
+
+def make_download_progress(status_message):
+    """生成下载进度回调，按 DOWNLOAD_PROGRESS_INTERVAL 节流编辑状态消息"""
+    last_edit = [0.0]
+
+    async def progress(stats):
+        now = time.monotonic()
+        if stats['done'] < stats['total'] and now - last_edit[0] < DOWNLOAD_PROGRESS_INTERVAL:
             return
-        for doc in approved_docs:
-            try:
-                await context.bot.send_message(
-                    chat_id=doc.user_id,
-                    text=f"您的文档《{doc.file_name}》已被管理员收录。\n获得5积分奖励！"
-                )
-            except Exception as e:
-                print(f"通知用户失败: {e}")
-        await update.message.reply_text(f'成功批准了 {approved_count} 个文档。')
+        last_edit[0] = now
+        await status_message.edit_text(
+            f"📥 正在下载... {stats['done']}/{stats['total']}\n"
+            f"✅ 成功: {stats['successful']}\n"
+            f"❌ 失败: {stats['failed']}"
+        )
+    return progress
 
 async def download_pending_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """下载待处理的文件，支持 all、all N、指定ID列表等参数"""
@@ -228,8 +257,7 @@ async def download_pending_files(update: Update, context: ContextTypes.DEFAULT_T
             if len(args) > 1 and args[1].isdigit():
                 limit = int(args[1])
             # 获取全部待下载文件
-            all_docs, _, _ = get_pending_documents(session, 1, 200)
-            docs = all_docs[:limit] if limit else all_docs
+            docs = get_all_pending_documents(session, limit)
             if not docs:
                 await message.reply_text("📭 没有待下载的文件")
                 session.close()
@@ -251,7 +279,8 @@ async def download_pending_files(update: Update, context: ContextTypes.DEFAULT_T
         status_message = await message.reply_text(f'开始下载 {len(docs)} 个文件...')
 
         # 批量下载文件
-        result = await batch_download_documents(session, docs, context.bot, DOWNLOAD_DIR)
+        result = await batch_download_documents(docs, context.bot, DOWNLOAD_DIR,
+                                                progress=make_download_progress(status_message))
         successful = result['successful']
         failed = result['failed']
         error_details = result['error_details']
@@ -369,7 +398,8 @@ async def list_pending_callback(update: Update, context: ContextTypes.DEFAULT_TY
             status_message = await query.message.reply_text('开始下载当前页文件...')
             
             # 批量下载文件
-            result = await batch_download_documents(session, docs, context.bot, DOWNLOAD_DIR)
+            result = await batch_download_documents(docs, context.bot, DOWNLOAD_DIR,
+                                                    progress=make_download_progress(status_message))
             successful = result['successful']
             failed = result['failed']
             error_details = result['error_details']
@@ -1,12 +1,21 @@
 from modules.db.orm_utils import SessionLocal
-from modules.db.orm_models import UploadedDocument, File
+from modules.db.orm_models import UploadedDocument, File, User
+from sqlalchemy import update, case, func
 from datetime import datetime
 from .points_system import add_points
 import os
-from ..config.config import DOWNLOAD_DIR
+import asyncio
+from telegram.error import BadRequest, RetryAfter
+from ..config.config import DOWNLOAD_DIR, DOWNLOAD_CONCURRENCY, DOWNLOAD_RETRIES, DOWNLOAD_RETRY_DELAY, APPROVE_POINTS
+
+APPROVE_BATCH_SIZE = 500  # 批量收录时每条 SQL 处理的记录数
 
 # 文档查重和保存业务逻辑
 
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 def check_duplicate_and_save(session, document, user_id):
     # 检查文件名和大小
     existing = session.query(UploadedDocument).filter_by(
@@ -82,17 +91,46 @@ async def approve_and_download_document(session, doc_id, admin_id, bot):
         return doc, f"下载失败: {str(e)}"
 
 def batch_approve_documents(session, admin_id):
-    pending_docs = session.query(UploadedDocument).filter(
+    """批量收录所有待审核文档，并按上传者汇总积分在同一事务中一次性发放
+
+    返回 (收录数量, {user_id: {'file_names': [...], 'points': 本次积分, 'total_points': 当前积分}})
+    """
+    pending = session.query(UploadedDocument.id, UploadedDocument.user_id, UploadedDocument.file_name).filter(
         UploadedDocument.status == 'pending'
     ).all()
-    approved_count = 0
-    for doc in pending_docs:
-        doc.status = 'approved'
-        doc.approved_by = admin_id
-        add_points(doc.user_id, 5)
-        approved_count += 1
+    if not pending:
+        return 0, {}
+    summaries = {}
+    for _, user_id, file_name in pending:
+        summary = summaries.setdefault(user_id, {'file_names': [], 'points': 0, 'total_points': None})
+        summary['file_names'].append(file_name)
+        summary['points'] += APPROVE_POINTS
+    doc_ids = [doc_id for doc_id, _, _ in pending]
+    for chunk in _chunks(doc_ids, APPROVE_BATCH_SIZE):
+        session.execute(
+            update(UploadedDocument)
+            .where(UploadedDocument.id.in_(chunk), UploadedDocument.status == 'pending')
+            .values(status='approved', approved_by=admin_id)
+            .execution_options(synchronize_session=False)
+        )
+    user_ids = list(summaries)
+    for chunk in _chunks(user_ids, APPROVE_BATCH_SIZE):
+        existing = {uid for uid, in session.query(User.user_id).filter(User.user_id.in_(chunk))}
+        session.add_all(User(user_id=uid, points=0) for uid in chunk if uid not in existing)
+        session.flush()
+        session.execute(
+            update(User)
+            .where(User.user_id.in_(chunk))
+            .values(points=func.coalesce(User.points, 0) + case(
+                {uid: summaries[uid]['points'] for uid in chunk}, value=User.user_id, else_=0
+            ))
+            .execution_options(synchronize_session=False)
+        )
     session.commit()
-    return approved_count, pending_docs
+    for chunk in _chunks(user_ids, APPROVE_BATCH_SIZE):
+        for uid, points in session.query(User.user_id, User.points).filter(User.user_id.in_(chunk)):
+            summaries[uid]['total_points'] = points
+    return len(pending), summaries
 
 def get_pending_documents(session, page, page_size):
     total_count = session.query(UploadedDocument).filter(
@@ -110,52 +148,117 @@ def get_pending_documents(session, page, page_size):
     ).limit(page_size).all()
     return docs, total_count, total_pages
 
-async def batch_download_documents(session, docs, bot, download_dir):
-    successful = 0
-    failed = 0
-    failed_docs = []  # 记录下载失败的文档
-    error_details = {}  # 记录每个文档的错误详情
-    
-    for doc in docs:
+def get_all_pending_documents(session, limit=None):
+    """获取全部已收录但未下载的文档，按文件大小升序"""
+    query = session.query(UploadedDocument).filter(
+        UploadedDocument.status == 'approved',
+        UploadedDocument.is_downloaded == False
+    ).order_by(UploadedDocument.file_size.asc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def _retry_after_seconds(error):
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+
+async def _download_with_retry(bot, doc, download_path):
+    """下载到临时文件后再改名，中途失败不会留下不完整的文件"""
+    part_path = download_path + '.part'
+    for attempt in range(DOWNLOAD_RETRIES):
         try:
             file = await bot.get_file(doc.tg_file_id)
             if not file:
                 raise Exception("无法获取文件信息")
-                
-            file_name = doc.file_name
-            os.makedirs(download_dir, exist_ok=True)
-            download_path = os.path.join(download_dir, file_name).replace('\\', '/')
-            
-            # 检查文件是否已存在
-            if os.path.exists(download_path):
-                # 如果文件已存在，更新数据库状态
-                doc.download_path = download_path
-                doc.is_downloaded = True
-                successful += 1
-                continue
-                
-            await file.download_to_drive(custom_path=download_path)
-            
-            # 验证文件是否成功下载
-            if not os.path.exists(download_path):
+            await file.download_to_drive(custom_path=part_path)
+            if not os.path.exists(part_path):
                 raise Exception("文件下载后未找到")
-                
-            doc.download_path = download_path
-            doc.is_downloaded = True
-            doc.download_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            successful += 1
-            
-        except Exception as e:
-            failed += 1
-            failed_docs.append(doc.id)
-            error_details[doc.id] = str(e)
-            print(f"文档 {doc.id} ({doc.file_name}) 下载失败: {e}")
-            continue
-            
+            os.replace(part_path, download_path)
+            return
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_after_seconds(e))
+        except BadRequest:
+            # 文件过大、file_id 失效等错误重试无效
+            raise
+        except Exception:
+            if attempt == DOWNLOAD_RETRIES - 1:
+                raise
+            await asyncio.sleep(DOWNLOAD_RETRY_DELAY * 2 ** attempt)
+    raise Exception("多次被限流，下载失败")
+
+def _resolve_download_path(doc, download_dir):
+    """已存在且大小一致的文件直接复用；同名但大小不同的文件改用带ID的文件名"""
+    download_path = os.path.join(download_dir, doc.file_name).replace('\\', '/')
+    if not os.path.exists(download_path):
+        return download_path, False
+    if not doc.file_size or os.path.getsize(download_path) == doc.file_size:
+        return download_path, True
+    return _id_suffixed_path(doc, download_dir)
+
+def _id_suffixed_path(doc, download_dir):
+    base, ext = os.path.splitext(doc.file_name)
+    download_path = os.path.join(download_dir, f"{base}_{doc.id}{ext}").replace('\\', '/')
+    exists = os.path.exists(download_path) and os.path.getsize(download_path) == doc.file_size
+    return download_path, exists
+
+def _reserve_download_paths(docs, download_dir):
+    """启动下载前为每个文档分配路径，同一批中同名的文档改用带ID的文件名，避免临时文件和目标文件互相覆盖"""
+    reserved = set()
+    plans = []
+    for doc in docs:
+        download_path, exists = _resolve_download_path(doc, download_dir)
+        if download_path in reserved:
+            download_path, exists = _id_suffixed_path(doc, download_dir)
+        reserved.add(download_path)
+        plans.append((doc, download_path, exists))
+    return plans
+
+def _mark_downloaded(doc_id, download_path):
+    # 每个下载使用独立会话提交，失败时随会话关闭回滚，不影响其他并发下载
+    with SessionLocal() as session:
+        session.execute(
+            update(UploadedDocument)
+            .where(UploadedDocument.id == doc_id)
+            .values(download_path=download_path, is_downloaded=True)
+        )
+        session.commit()
+
+async def batch_download_documents(docs, bot, download_dir, progress=None):
+    """并发下载文档，每个文件完成后立即提交，中断后重新执行会跳过已完成的部分
+
+    progress: 可选的异步回调，每处理完一个文件以统计字典为参数调用
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    stats = {'total': len(docs), 'done': 0, 'successful': 0, 'failed': 0}
+    failed_docs = []  # 记录下载失败的文档
+    error_details = {}  # 记录每个文档的错误详情
+    semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+    async def download(doc, download_path, exists):
+        async with semaphore:
+            try:
+                if not exists:
+                    await _download_with_retry(bot, doc, download_path)
+                await asyncio.to_thread(_mark_downloaded, doc.id, download_path)
+                stats['successful'] += 1
+            except Exception as e:
+                stats['failed'] += 1
+                failed_docs.append(doc.id)
+                error_details[doc.id] = str(e)
+                print(f"文档 {doc.id} ({doc.file_name}) 下载失败: {e}")
+            stats['done'] += 1
+            if progress:
+                try:
+                    await progress(dict(stats))
+                except Exception as e:
+                    print(f"更新下载进度失败: {e}")
+
+    await asyncio.gather(*(download(*plan) for plan in _reserve_download_paths(docs, download_dir)))
+
     # 返回更多详细信息以便处理
     return {
-        'successful': successful,
-        'failed': failed,
+        'successful': stats['successful'],
+        'failed': stats['failed'],
         'failed_docs': failed_docs,
         'error_details': error_details
     }
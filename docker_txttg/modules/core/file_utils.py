@@ -1,70 +1,247 @@
 import os
 import random
+import threading
+import time
+from functools import wraps
+from sqlalchemy import func, exists, insert, update
 from modules.db.orm_utils import SessionLocal
-from modules.db.orm_models import File, UploadedDocument, SentFile
+from modules.db.orm_models import File, UploadedDocument, SentFile, FileFeedback, HotFile
 from modules.config.config import TXT_ROOT, TXT_EXTS
 
-def reload_txt_files():
-    txt_files = []
-    for root, dirs, files in os.walk(TXT_ROOT):
-        for file in files:
-            if any(file.endswith(ext) for ext in TXT_EXTS):
-                txt_files.append(os.path.join(root, file))
-    inserted, skipped = 0, 0
+RELOAD_BATCH_SIZE = 1000  # 每个事务写入的记录数
+MASS_DELETE_RATIO = 0.5   # 非完整扫描时待删除记录超过该比例则不删除（可能是目录未挂载），需 /reload full 确认
+
+# 目录路径 -> (mtime, 子目录列表)，用于跳过未变化的目录
+_dir_cache = {}
+
+# /reload 与文件监控可能在不同线程同时写 files 表，串行执行避免重复插入
+_sync_lock = threading.Lock()
+
+def _synchronized(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _sync_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _is_txt_file(name):
+    return any(name.endswith(ext) for ext in TXT_EXTS)
+
+def _delete_files(session, file_ids):
+    """删除 files 记录及引用它们的发送记录、评价和热榜记录（由调用方提交事务）"""
+    session.query(SentFile).filter(SentFile.source == 'file', SentFile.file_id.in_(file_ids)).delete(synchronize_session=False)
+    session.query(FileFeedback).filter(FileFeedback.file_id.in_(file_ids)).delete(synchronize_session=False)
+    session.query(HotFile).filter(HotFile.file_id.in_(file_ids)).delete(synchronize_session=False)
+    session.query(File).filter(File.file_id.in_(file_ids)).delete(synchronize_session=False)
+
+@_synchronized
+def reload_txt_files(progress=None, full=False):
+    """增量扫描 TXT_ROOT，与 files 表比对后分批写入新增、变更和删除
+
+    progress: 可选回调，扫描过程中以统计字典为参数调用
+    full: 为 True 时忽略目录 mtime 缓存，完整扫描所有目录；目录 mtime 不随其中文件被原地改写而变化，
+          增量扫描不会发现这类文件的大小变化，需要完整扫描
+    返回统计字典：scanned, inserted, updated, deleted, skipped, held（因比例过高未删除的记录数）
+    TXT_ROOT 无法访问时抛出 OSError，不修改数据库
+    """
+    stats = {'scanned': 0, 'inserted': 0, 'updated': 0, 'deleted': 0, 'skipped': 0, 'held': 0}
     with SessionLocal() as session:
-        for file_path in txt_files:
-            try:
-                file_size = os.path.getsize(file_path)
-                file = session.query(File).filter_by(file_path=file_path).first()
-                if file:
-                    if file.file_size != file_size:
-                        file.file_size = file_size
-                        session.commit()
-                    skipped += 1
-                else:
-                    new_file = File(file_path=file_path, file_size=file_size)
-                    session.add(new_file)
-                    session.commit()
-                    inserted += 1
-            except Exception:
-                skipped += 1
-    return inserted, skipped
+        existing = {path: (file_id, size) for file_id, path, size in
+                    session.query(File.file_id, File.file_path, File.file_size)}
+    # 目录未变化时其中的文件沿用数据库记录
+    files_by_dir = {}
+    for path in existing:
+        files_by_dir.setdefault(os.path.dirname(path), []).append(path)
+
+    seen = set()
+    inserts, updates = [], []
+    reported = 0
+    stack = [TXT_ROOT]
+    while stack:
+        directory = stack.pop()
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            if directory == TXT_ROOT:
+                raise
+            continue
+        cached = _dir_cache.get(directory)
+        if not full and cached and cached[0] == mtime:
+            kept = [p for p in files_by_dir.get(directory, []) if _is_txt_file(os.path.basename(p))]
+            seen.update(kept)
+            stats['scanned'] += len(kept)
+            stats['skipped'] += len(kept)
+            stack.extend(cached[1])
+            continue
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                subdirs.append(entry.path)
+                            continue
+                        if not _is_txt_file(entry.name):
+                            continue
+                        stats['scanned'] += 1
+                        file_size = entry.stat().st_size
+                    except OSError:
+                        stats['skipped'] += 1
+                        continue
+                    seen.add(entry.path)
+                    record = existing.get(entry.path)
+                    if record is None:
+                        inserts.append({'file_path': entry.path, 'file_size': file_size})
+                    elif record[1] != file_size:
+                        updates.append({'file_id': record[0], 'file_size': file_size})
+                    else:
+                        stats['skipped'] += 1
+        except OSError:
+            if directory == TXT_ROOT:
+                raise
+            continue
+        _dir_cache[directory] = (mtime, subdirs)
+        stack.extend(subdirs)
+        if progress and stats['scanned'] - reported >= RELOAD_BATCH_SIZE:
+            reported = stats['scanned']
+            progress(dict(stats))
+
+    # 只删除 TXT_ROOT 下、扩展名匹配且磁盘上确实不存在的记录
+    root_prefix = os.path.join(TXT_ROOT, '')
+    deletions = [
+        file_id for path, (file_id, _) in existing.items()
+        if path not in seen and path.startswith(root_prefix)
+        and _is_txt_file(os.path.basename(path)) and not os.path.exists(path)
+    ]
+    # 大批量删除多半是存储未挂载或目录被清空，只有完整扫描时才执行
+    if not full and deletions and len(deletions) > len(existing) * MASS_DELETE_RATIO:
+        stats['held'] = len(deletions)
+        deletions = []
+
+    with SessionLocal() as session:
+        for chunk in _chunks(inserts, RELOAD_BATCH_SIZE):
+            session.execute(insert(File), chunk)
+            session.commit()
+            stats['inserted'] += len(chunk)
+            if progress:
+                progress(dict(stats))
+        for chunk in _chunks(updates, RELOAD_BATCH_SIZE):
+            session.execute(update(File), chunk)
+            session.commit()
+            stats['updated'] += len(chunk)
+            if progress:
+                progress(dict(stats))
+        for chunk in _chunks(deletions, RELOAD_BATCH_SIZE):
+            _delete_files(session, chunk)
+            session.commit()
+            stats['deleted'] += len(chunk)
+            if progress:
+                progress(dict(stats))
+    return stats
+
+@_synchronized
+def sync_file_paths(paths):
+    """按磁盘实际状态同步指定路径：存在则新增或更新大小，不存在则删除记录
+
+    供文件监控批量调用，返回 (upserted, deleted)
+    """
+    upserted, deleted = 0, 0
+    with SessionLocal() as session:
+        for chunk in _chunks(list(paths), RELOAD_BATCH_SIZE):
+            existing = {path: (file_id, size) for file_id, path, size in
+                        session.query(File.file_id, File.file_path, File.file_size).filter(File.file_path.in_(chunk))}
+            inserts, updates, deletions = [], [], []
+            for path in chunk:
+                record = existing.get(path)
+                try:
+                    file_size = os.path.getsize(path) if _is_txt_file(os.path.basename(path)) else None
+                except OSError:
+                    file_size = None
+                if file_size is None:
+                    if record and not os.path.exists(path):
+                        deletions.append(record[0])
+                elif record is None:
+                    inserts.append({'file_path': path, 'file_size': file_size})
+                elif record[1] != file_size:
+                    updates.append({'file_id': record[0], 'file_size': file_size})
+            if inserts:
+                session.execute(insert(File), inserts)
+            if updates:
+                session.execute(update(File), updates)
+            if deletions:
+                _delete_files(session, deletions)
+            session.commit()
+            upserted += len(inserts) + len(updates)
+            deleted += len(deletions)
+    return upserted, deleted
+
+RANDOM_PICK_ATTEMPTS = 5  # 随机探测到不可发送的文件时的重试次数
+RANDOM_PICK_PROBES = 8    # 每次抽取按主键随机点查的次数，未命中再按随机起点顺序查找
+KEY_RANGE_TTL = 60        # 主键范围缓存时间（秒）
+
+# 表名 -> (过期时间, 最小主键, 最大主键)
+_key_range_cache = {}
+
+def _key_range(session, model, key):
+    now = time.monotonic()
+    cached = _key_range_cache.get(model.__tablename__)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+    low, high = session.query(func.min(key), func.max(key)).one()
+    _key_range_cache[model.__tablename__] = (now + KEY_RANGE_TTL, low, high)
+    return low, high
+
+def _pick_random_unsent(session, model, key, source, user_id, *filters):
+    """随机取一个用户未收到过的记录，查询次数有上限，耗时与文件总数和用户历史记录数无关
+
+    先在缓存的主键范围内随机点查（拒绝采样，命中时每条未发送记录概率相同），
+    连续未命中（主键稀疏或大部分已发送）时从随机起点按主键顺序取第一条未发送记录，到末尾后回绕一次。
+    """
+    low, high = _key_range(session, model, key)
+    if low is None:
+        return None
+    sent = exists().where(
+        SentFile.user_id == user_id,
+        SentFile.source == source,
+        SentFile.file_id == key
+    )
+    unsent = session.query(model).filter(*filters, ~sent)
+    for _ in range(RANDOM_PICK_PROBES):
+        row = unsent.filter(key == random.randint(low, high)).first()
+        if row is not None:
+            return row
+    pivot = random.randint(low, high)
+    row = unsent.filter(key >= pivot).order_by(key.asc()).first()
+    if row is None:
+        row = unsent.filter(key < pivot).order_by(key.asc()).first()
+    return row
 
 def get_unsent_files(user_id):
+    # 70% 概率优先从 files 中抽取，没有可发文件时再尝试另一来源
+    sources = ['file', 'uploaded'] if random.random() < 0.7 else ['uploaded', 'file']
     with SessionLocal() as session:
-        file_ids = {row.file_id for row in session.query(File.file_id).all()}
-        uploaded_ids = {doc.id for doc in session.query(UploadedDocument).filter_by(status='approved').all()}
-        sent_file_ids = {record.file_id for record in session.query(SentFile).filter_by(user_id=user_id, source='file').all()}
-        sent_uploaded_ids = {record.file_id for record in session.query(SentFile).filter_by(user_id=user_id, source='uploaded').all()}
-        unsent_file_ids = list(file_ids - sent_file_ids)
-        unsent_uploaded_ids = list(uploaded_ids - sent_uploaded_ids)
-        if not unsent_file_ids and not unsent_uploaded_ids:
-            return None
-        if unsent_file_ids and unsent_uploaded_ids:
-            if random.random() < 0.7:
-                file_id = random.choice(unsent_file_ids)
-                source = 'file'
-            else:
-                file_id = random.choice(unsent_uploaded_ids)
-                source = 'uploaded'
-        elif unsent_file_ids:
-            file_id = random.choice(unsent_file_ids)
-            source = 'file'
-        else:
-            file_id = random.choice(unsent_uploaded_ids)
-            source = 'uploaded'
-        if source == 'file':
-            file = session.query(File).filter_by(file_id=file_id).first()
-            if file:
-                if file.tg_file_id:
-                    return {'id': file_id, 'source': source, 'tg_file_id': file.tg_file_id}
-                elif file.file_path and os.path.exists(file.file_path):
-                    return {'id': file_id, 'source': source, 'file_path': file.file_path}
-        else:
-            doc = session.query(UploadedDocument).filter_by(id=file_id).first()
-            if doc:
-                if doc.tg_file_id:
-                    return {'id': file_id, 'source': source, 'tg_file_id': doc.tg_file_id}
-                elif doc.download_path and os.path.exists(doc.download_path):
-                    return {'id': file_id, 'source': source, 'file_path': doc.download_path}
+        for source in sources:
+            for _ in range(RANDOM_PICK_ATTEMPTS):
+                if source == 'file':
+                    file = _pick_random_unsent(session, File, File.file_id, source, user_id)
+                    if not file:
+                        break
+                    if file.tg_file_id:
+                        return {'id': file.file_id, 'source': source, 'tg_file_id': file.tg_file_id}
+                    elif file.file_path and os.path.exists(file.file_path):
+                        return {'id': file.file_id, 'source': source, 'file_path': file.file_path}
+                else:
+                    doc = _pick_random_unsent(session, UploadedDocument, UploadedDocument.id, source, user_id,
+                                              UploadedDocument.status == 'approved')
+                    if not doc:
+                        break
+                    if doc.tg_file_id:
+                        return {'id': doc.id, 'source': source, 'tg_file_id': doc.tg_file_id}
+                    elif doc.download_path and os.path.exists(doc.download_path):
+                        return {'id': doc.id, 'source': source, 'file_path': doc.download_path}
         return None
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from telegram.ext import Application, ContextTypes
+from modules.config.config import TXT_ROOT, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+from .file_utils import reload_txt_files, sync_file_paths
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog 不可用时使用轮询模式
+    Observer = None
+    FileSystemEventHandler = object
+
+# TXT_ROOT 文件监控：watchdog（inotify）可用时按事件增量同步，否则（未安装或无法监听 TXT_ROOT）定时执行增量扫描
+
+class _ChangeCollector(FileSystemEventHandler):
+    """在 watchdog 线程中收集变更路径，由任务队列防抖后批量写库"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # 路径 -> 最后一次事件时间
+        self._rescan = False  # 目录级变更（目录移动/删除）需要一次增量扫描
+
+    def _touch(self, path):
+        with self._lock:
+            self._pending[path] = time.monotonic()
+
+    def _request_rescan(self):
+        with self._lock:
+            self._rescan = True
+
+    def on_created(self, event):
+        if event.is_directory:
+            self._request_rescan()
+        else:
+            self._touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def on_closed(self, event):
+        self._touch(event.src_path)
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            self._request_rescan()
+        else:
+            self._touch(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            self._request_rescan()
+        else:
+            self._touch(event.src_path)
+            self._touch(event.dest_path)
+
+    def take_settled(self, quiet_seconds):
+        """取出已超过 quiet_seconds 没有新事件的路径（文件复制过程中不会被提前入库）"""
+        deadline = time.monotonic() - quiet_seconds
+        with self._lock:
+            settled = [path for path, t in self._pending.items() if t <= deadline]
+            for path in settled:
+                del self._pending[path]
+            rescan, self._rescan = self._rescan, False
+        return settled, rescan
+
+async def _auto_reload(label):
+    """自动增量扫描：TXT_ROOT 不可访问时跳过本次，大批量删除留给管理员 /reload full 确认"""
+    try:
+        stats = await asyncio.to_thread(reload_txt_files)
+    except OSError as e:
+        print(f"文件监控{label}: 无法访问 TXT_ROOT，跳过本次扫描: {e}")
+        return None
+    if stats['held']:
+        print(f"文件监控{label}: {stats['held']} 个记录对应的文件已不存在，数量过多未删除，请确认后执行 /reload full")
+    return stats
+
+async def _flush_changes(context: ContextTypes.DEFAULT_TYPE):
+    collector = context.job.data
+    paths, rescan = collector.take_settled(WATCH_DEBOUNCE_SECONDS)
+    if rescan:
+        stats = await _auto_reload('')
+        if stats:
+            print(f"文件监控: 目录变更，增量扫描新增 {stats['inserted']} 个，更新 {stats['updated']} 个，删除 {stats['deleted']} 个")
+    if paths:
+        upserted, deleted = await asyncio.to_thread(sync_file_paths, paths)
+        if upserted or deleted:
+            print(f"文件监控: 同步 {upserted} 个文件，删除 {deleted} 个记录")
+
+async def _poll_changes(context: ContextTypes.DEFAULT_TYPE):
+    stats = await _auto_reload('(轮询)')
+    if stats and (stats['inserted'] or stats['updated'] or stats['deleted']):
+        print(f"文件监控(轮询): 新增 {stats['inserted']} 个，更新 {stats['updated']} 个，删除 {stats['deleted']} 个")
+
+def _start_polling(application: Application):
+    application.job_queue.run_repeating(_poll_changes, interval=WATCH_POLL_INTERVAL, first=WATCH_POLL_INTERVAL,
+                                        name='file_watcher_poll')
+    print(f"文件监控已启动（轮询模式，每 {WATCH_POLL_INTERVAL} 秒）: {TXT_ROOT}")
+
+def start_file_watcher(application: Application):
+    """启动 TXT_ROOT 监控，返回 watchdog Observer（轮询模式返回 None）"""
+    if Observer is None:
+        _start_polling(application)
+        return None
+    collector = _ChangeCollector()
+    observer = Observer()
+    try:
+        observer.schedule(collector, TXT_ROOT, recursive=True)
+        observer.daemon = True
+        observer.start()
+    except Exception as e:
+        # TXT_ROOT 不存在或超出 inotify 监听上限时不影响 Bot 启动
+        print(f"文件监控无法监听 {TXT_ROOT}，改用轮询模式: {e}")
+        _start_polling(application)
+        return None
+    application.job_queue.run_repeating(_flush_changes, interval=WATCH_DEBOUNCE_SECONDS, data=collector,
+                                        name='file_watcher_flush')
+    print(f"文件监控已启动（inotify 模式）: {TXT_ROOT}")
+    return observer
+
+def stop_file_watcher(observer):
+    if observer is not None:
+        observer.stop()
+        observer.join(timeout=5)
@@ -0,0 +1,48 @@
+import asyncio
+from telegram.error import RetryAfter, Forbidden
+from modules.config.config import NOTIFY_RATE, NOTIFY_CONCURRENCY
+
+# 批量通知：限制每秒发送数和并发数，避免触发 Telegram 的 flood 限制
+
+class _Pacer:
+    """按固定间隔分配发送时间片"""
+
+    def __init__(self, rate):
+        self._interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+async def send_bulk_messages(bot, messages):
+    """并发发送 {chat_id: text}，返回 (成功数, 失败数)"""
+    pacer = _Pacer(NOTIFY_RATE)
+    semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    result = {'sent': 0, 'failed': 0}
+
+    async def send(chat_id, text):
+        async with semaphore:
+            for _ in range(2):
+                await pacer.wait()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                    result['sent'] += 1
+                    return
+                except RetryAfter as e:
+                    retry_after = e.retry_after
+                    await asyncio.sleep(retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after)
+                except Forbidden as e:
+                    print(f"通知用户 {chat_id} 失败（已屏蔽机器人）: {e}")
+                    break
+                except Exception as e:
+                    print(f"通知用户 {chat_id} 失败: {e}")
+                    break
+            result['failed'] += 1
+
+    await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages.items()))
+    return result['sent'], result['failed']
@@ -4,6 +4,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from modules.db.orm_utils import SessionLocal
 from modules.db.orm_models import User
+from modules.db.db_utils import invalidate_user_cache
 from modules.config.config import VIP_DAYS, VIP_PACKAGES
 # # VIP套餐配置
 # VIP_DAYS = [3, 7, 30, 90, 180, 365]  # 所有有效的VIP套餐天数
@@ -410,6 +411,7 @@ def upgrade_vip_level(user_id: int, target_level: int, target_days: int) -> tupl
         user.vip_level = target_level
         user.vip_expiry_date = new_expiry.strftime('%Y-%m-%d')
         session.commit()
+        invalidate_user_cache(user_id)
         
         # 构建返回消息
         if target_level == user.vip_level:
@@ -4,6 +4,8 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 from modules.db.orm_utils import SessionLocal
 from modules.db.orm_models import User, File, UploadedDocument, SentFile
+from modules.db.db_utils import get_user_vip_level as get_cached_vip_level, mark_file_sent
+from modules.db.search_index import search_files_page, search_uploaded_documents_page
 from datetime import datetime
 from modules.config.config import MAX_TG_MSG_LEN, PAGE_SIZE, BOT_USERNAME, SS_PAGE_SIZE
 # 工具函数：分割长消息
@@ -20,9 +22,8 @@ def set_bot_username(username):
     BOT_USERNAME = username
 
 def get_user_vip_level(user_id):
-    with SessionLocal() as session:
-        user = session.query(User).filter_by(user_id=user_id).first()
-        return user.vip_level if user else 0
+    vip_level, _ = get_cached_vip_level(user_id)
+    return vip_level
 
 def get_file_by_id(file_id):
     with SessionLocal() as session:
@@ -38,19 +39,6 @@ def get_uploaded_file_by_id(file_id):
             return file.tg_file_id, file.download_path
         return None
 
-def search_files_by_name(keyword):
-    with SessionLocal() as session:
-        results = session.query(File).filter(File.file_path.like(f"%{keyword}%")).order_by(File.file_id.desc()).all()
-        return [(file.file_id, file.file_path, file.tg_file_id) for file in results]
-
-def search_uploaded_files_by_name(keyword):
-    with SessionLocal() as session:
-        results = session.query(UploadedDocument).filter(
-            UploadedDocument.file_name.like(f"%{keyword}%"),
-            UploadedDocument.status == 'approved'
-        ).order_by(UploadedDocument.id.desc()).all()
-        return [(file.id, file.file_name, file.tg_file_id) for file in results]
-
 def update_file_tg_id(file_id, tg_file_id):
     with SessionLocal() as session:
         file = session.query(File).filter_by(file_id=file_id).first()
@@ -65,17 +53,14 @@ def update_uploaded_file_tg_id(file_id, tg_file_id):
             file.tg_file_id = tg_file_id
             session.commit()
 
-def build_search_keyboard(results, page, keyword):
-    start = page * PAGE_SIZE
-    end = start + PAGE_SIZE
-    page_results = results[start:end]
+def build_search_keyboard(page_results, page, keyword, total):
     keyboard = []
     for file_id, file_path, tg_file_id in page_results:
         filename = os.path.basename(file_path)
         # 按钮 callback_data: sget|file_id
         keyboard.append([InlineKeyboardButton(filename, callback_data=f"sget|{file_id}")])
     # 分页按钮
-    total_pages = math.ceil(len(results) / PAGE_SIZE)
+    total_pages = math.ceil(total / PAGE_SIZE)
     nav = []
     if page > 0:
         nav.append(InlineKeyboardButton('上一页', callback_data=f'spage|{keyword}|{page-1}'))
@@ -85,16 +70,13 @@ def build_search_keyboard(results, page, keyword):
         keyboard.append(nav)
     return InlineKeyboardMarkup(keyboard)
 
-def build_uploaded_search_keyboard(results, page, keyword):
-    start = page * PAGE_SIZE
-    end = start + PAGE_SIZE
-    page_results = results[start:end]
+def build_uploaded_search_keyboard(page_results, page, keyword, total):
     keyboard = []
     for file_id, file_name, tg_file_id in page_results:
         # 按钮 callback_data: upload_file_id
         keyboard.append([InlineKeyboardButton(file_name, callback_data=f"upload_{file_id}")])
     # 分页按钮
-    total_pages = math.ceil(len(results) / PAGE_SIZE)
+    total_pages = math.ceil(total / PAGE_SIZE)
     nav = []
     if page > 0:
         nav.append(InlineKeyboardButton('上一页', callback_data=f'spage|{keyword}|{page-1}'))
@@ -114,12 +96,12 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text('用法：/s <关键词>')
         return
     keyword = ' '.join(context.args)
-    results = search_uploaded_files_by_name(keyword)
-    if not results:
+    results, total = search_uploaded_documents_page(keyword, 0, PAGE_SIZE)
+    if not total:
         await update.message.reply_text('未找到相关文件。')
         return
-    reply_markup = build_uploaded_search_keyboard(results, 0, keyword)
-    await update.message.reply_text(f'搜索结果，共{len(results)}个文件：', reply_markup=reply_markup)
+    reply_markup = build_uploaded_search_keyboard(results, 0, keyword, total)
+    await update.message.reply_text(f'搜索结果，共{total}个文件：', reply_markup=reply_markup)
 
 async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -127,8 +109,8 @@ async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data[0] == 'spage':
         keyword = data[1]
         page = int(data[2])
-        results = search_uploaded_files_by_name(keyword)
-        reply_markup = build_uploaded_search_keyboard(results, page, keyword)
+        results, total = search_uploaded_documents_page(keyword, page, PAGE_SIZE)
+        reply_markup = build_uploaded_search_keyboard(results, page, keyword, total)
         await query.edit_message_reply_markup(reply_markup=reply_markup)
     elif data[0].startswith('upload_'):
         file_id = int(data[0].split('_')[1])
@@ -199,21 +181,8 @@ async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.answer('文件丢失', show_alert=True)
                 return
 
-            # 记录发送，只记录到 sent_files 表
-            with SessionLocal() as session:
-                # 获取上传文档信息
-                uploaded_doc = session.query(UploadedDocument).filter_by(id=file_id).first()
-                if uploaded_doc:
-                    # 记录发送，并标记来源为 uploaded
-                    date = datetime.now().strftime('%Y-%m-%d')
-                    sent_file = SentFile(
-                        user_id=query.from_user.id,
-                        file_id=uploaded_doc.id,  # 使用 uploaded_document 的 id
-                        date=date,
-                        source='uploaded'
-                    )
-                    session.merge(sent_file)
-                    session.commit()
+            # 记录发送，只记录到 sent_files 表，并标记来源为 uploaded（使用 uploaded_document 的 id）
+            mark_file_sent(query.from_user.id, file_id, source='uploaded')
 
         except Exception as e:
             await query.answer(f'发送失败: {e}', show_alert=True)
@@ -241,8 +210,7 @@ async def ss_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await send_ss_page(update, context, keyword, page=page, edit=True)
 
 async def send_ss_page(update, context, keyword, page=0, edit=False):
-    results = search_files_by_name(keyword)
-    total = len(results)
+    page_rows, total = search_files_page(keyword, page, SS_PAGE_SIZE)
     if total == 0:
         msg = '未找到相关文件。'
         if edit and update.callback_query:
@@ -251,8 +219,6 @@ async def send_ss_page(update, context, keyword, page=0, edit=False):
             await update.message.reply_text(msg)
         return
     start = page * SS_PAGE_SIZE
-    end = start + SS_PAGE_SIZE
-    page_rows = results[start:end]
     links = []
     for idx, (file_id, file_path, tg_file_id) in enumerate(page_rows, start+1):
         filename = os.path.basename(file_path)
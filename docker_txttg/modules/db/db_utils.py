@@ -1,10 +1,38 @@
 import os
+import time
 from datetime import datetime, timedelta
 from .orm_utils import SessionLocal
-from .orm_models import User, File, SentFile, FileFeedback, UploadedDocument
+from sqlalchemy import func, insert
+from .orm_models import User, File, SentFile, FileFeedback, UploadedDocument, DailyUsage, HotFile
 
 # 用户、文件、VIP、反馈等数据库操作
 
+USER_CACHE_TTL = 300  # 用户权益缓存有效期（秒）
+
+# user_id -> {'expires', 'date', 'vip_level', 'vip_expiry_date', 'sent_today'}
+# 缓存 VIP 等级、过期日期和今日已领取数量，修改这些数据的地方需调用 invalidate_user_cache
+_user_cache = {}
+
+def _get_user_cache(user_id):
+    today = datetime.now().strftime('%Y-%m-%d')
+    entry = _user_cache.get(user_id)
+    if not entry or entry['expires'] <= time.monotonic() or entry['date'] != today:
+        entry = {'expires': time.monotonic() + USER_CACHE_TTL, 'date': today}
+        _user_cache[user_id] = entry
+    return entry
+
+def invalidate_user_cache(user_id):
+    _user_cache.pop(user_id, None)
+
+def _daily_limit(vip_level):
+    if vip_level == 3:
+        return 100
+    elif vip_level == 2:
+        return 50
+    elif vip_level == 1:
+        return 30
+    return 10
+
 def get_or_create_file(file_path, tg_file_id=None):
     with SessionLocal() as session:
         # 首先检查是否是上传的文档
@@ -67,44 +95,62 @@ def set_user_vip_level(user_id, vip_level, days=30):
                 user.vip_level = 0
                 user.vip_expiry_date = None
             session.commit()
+    invalidate_user_cache(user_id)
 
 def get_user_vip_level(user_id):
+    entry = _get_user_cache(user_id)
+    if 'vip_level' in entry:
+        expiry = entry['vip_expiry_date']
+        # 缓存期间过期的需要回到数据库降级
+        if not entry['vip_level'] or not expiry or datetime.now().date() <= datetime.strptime(expiry, '%Y-%m-%d').date():
+            return entry['vip_level'], _daily_limit(entry['vip_level'])
     with SessionLocal() as session:
         user = session.query(User).filter_by(user_id=user_id).first()
-        if not user or not user.vip_level:
-            return 0, 10
-        if user.vip_expiry_date:
-            expiry_date = datetime.strptime(user.vip_expiry_date, '%Y-%m-%d')
+        vip_level = user.vip_level if user and user.vip_level else 0
+        vip_expiry_date = user.vip_expiry_date if user else None
+        if vip_level and vip_expiry_date:
+            expiry_date = datetime.strptime(vip_expiry_date, '%Y-%m-%d')
             if datetime.now().date() > expiry_date.date():
                 user.vip_level = 0
                 session.commit()
-                return 0, 10
-        if user.vip_level == 3:
-            return user.vip_level, 100
-        elif user.vip_level == 2:
-            return user.vip_level, 50
-        elif user.vip_level == 1:
-            return user.vip_level, 30
-        else:
-            return user.vip_level, 10
+                vip_level = 0
+    entry['vip_level'] = vip_level
+    entry['vip_expiry_date'] = vip_expiry_date
+    return vip_level, _daily_limit(vip_level)
 
 def get_sent_file_ids(user_id):
     with SessionLocal() as session:
         return session.query(SentFile).filter_by(user_id=user_id).count()
 
+def _increment_daily_usage(session, user_id, date):
+    updated = session.query(DailyUsage).filter_by(user_id=user_id, date=date).update(
+        {DailyUsage.count: DailyUsage.count + 1}, synchronize_session=False
+    )
+    if not updated:
+        session.add(DailyUsage(user_id=user_id, date=date, count=1))
+
 def mark_file_sent(user_id, file_id, source='file'):
     with SessionLocal() as session:
         date = datetime.now().strftime('%Y-%m-%d')
+        existing = session.get(SentFile, (user_id, file_id))
+        counted_today = existing is not None and existing.date == date
         session.merge(SentFile(user_id=user_id, file_id=file_id, date=date, source=source))
+        # 今日计数与发送记录在同一事务中更新
+        if not counted_today:
+            _increment_daily_usage(session, user_id, date)
         session.commit()
+    entry = _get_user_cache(user_id)
+    if not counted_today and 'sent_today' in entry and entry['date'] == date:
+        entry['sent_today'] += 1
 
 def get_today_sent_count(user_id):
+    entry = _get_user_cache(user_id)
+    if 'sent_today' in entry:
+        return entry['sent_today']
     with SessionLocal() as session:
-        today = datetime.now().strftime('%Y-%m-%d')
-        count = session.query(SentFile).filter_by(
-            user_id=user_id, 
-            date=today
-        ).count()
+        usage = session.get(DailyUsage, (user_id, entry['date']))
+        count = usage.count if usage else 0
+    entry['sent_today'] = count
     return count
 
 def record_feedback(user_id, file_id, feedback):
@@ -112,3 +158,50 @@ def record_feedback(user_id, file_id, feedback):
         date = datetime.now().strftime('%Y-%m-%d')
         session.merge(FileFeedback(user_id=user_id, file_id=file_id, feedback=feedback, date=date))
         session.commit()
+    _hot_state['dirty'] = True
+
+HOT_DAYS = 7  # 热榜统计最近几天的👍
+
+# 热榜状态：有新反馈或跨天后才需要重建
+_hot_state = {'dirty': True, 'date': None}
+
+def rebuild_hot_files(force=False):
+    """重建热榜表 hot_files，没有变化时直接返回 None，否则返回上榜文件数"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    if not force and not _hot_state['dirty'] and _hot_state['date'] == today:
+        return None
+    # 先清除标记，重建期间收到的反馈会触发下一次重建
+    _hot_state['dirty'] = False
+    since = (datetime.now() - timedelta(days=HOT_DAYS)).strftime('%Y-%m-%d')
+    with SessionLocal() as session:
+        likes = func.count().label('likes')
+        rows = (
+            session.query(FileFeedback.file_id, likes)
+            .join(File, File.file_id == FileFeedback.file_id)
+            .filter(FileFeedback.feedback == 1, FileFeedback.date >= since)
+            .group_by(FileFeedback.file_id, File.file_path)
+            .order_by(likes.desc(), File.file_path)
+            .all()
+        )
+        session.query(HotFile).delete(synchronize_session=False)
+        if rows:
+            session.execute(insert(HotFile), [
+                {'rank': rank, 'file_id': file_id, 'likes': count}
+                for rank, (file_id, count) in enumerate(rows, 1)
+            ])
+        session.commit()
+    _hot_state['date'] = today
+    return len(rows)
+
+def get_hot_page(page, page_size):
+    """读取一页热榜，返回 ([(file_path, tg_file_id, likes)], 上榜总数)"""
+    with SessionLocal() as session:
+        total = session.query(func.max(HotFile.rank)).scalar() or 0
+        rows = (
+            session.query(File.file_path, File.tg_file_id, HotFile.likes)
+            .join(File, File.file_id == HotFile.file_id)
+            .filter(HotFile.rank > page * page_size, HotFile.rank <= (page + 1) * page_size)
+            .order_by(HotFile.rank)
+            .all()
+        )
+    return [tuple(row) for row in rows], total
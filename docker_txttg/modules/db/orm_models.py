@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, UniqueConstraint, Boolean, Index
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -26,6 +26,16 @@ class SentFile(Base):
     date = Column(String(32))
     source = Column(String(20), default='file')  # 'file' 表示来自 files 表，'uploaded' 表示来自 uploaded_documents 表
 
+    __table_args__ = (
+        Index('ix_sent_files_user_source_file', 'user_id', 'source', 'file_id'),
+    )
+
+class DailyUsage(Base):
+    __tablename__ = 'daily_usage'
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    date = Column(String(32), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)  # 当天领取的文件数
+
 class FileFeedback(Base):
     __tablename__ = 'file_feedback'
     user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
@@ -33,6 +43,12 @@ class FileFeedback(Base):
     feedback = Column(Integer)  # 1=👍, -1=👎
     date = Column(String(32))
 
+class HotFile(Base):
+    __tablename__ = 'hot_files'
+    rank = Column(Integer, primary_key=True, autoincrement=False)  # 排名，从1开始
+    file_id = Column(Integer, ForeignKey('files.file_id'))
+    likes = Column(Integer, default=0)  # 近7天👍数
+
 class UploadedDocument(Base):
     __tablename__ = 'uploaded_documents'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -0,0 +1,167 @@
+import time
+from sqlalchemy import text
+from .orm_utils import engine, SessionLocal
+
+# 文件名全文检索索引
+# SQLite：FTS5 外部内容表 + trigram 分词（按三字切分，中日韩文字无需分词即可子串匹配），由触发器与原表保持同步
+# MySQL：FULLTEXT 索引 + ngram 分词，由 MySQL 自动维护
+
+SQLITE_MIN_KEYWORD_LEN = 3  # trigram 分词可检索的最短关键词
+MYSQL_MIN_KEYWORD_LEN = 2   # ngram_token_size 默认值
+
+# 索引名: (原表, 主键, 被索引字段)
+SEARCH_INDEXES = {
+    'files_fts': ('files', 'file_id', 'file_path'),
+    'uploaded_documents_fts': ('uploaded_documents', 'id', 'file_name'),
+}
+
+# 各索引返回的字段及附加过滤条件
+_RESULT_COLUMNS = {
+    'files_fts': ('file_id', 'file_path', 'tg_file_id'),
+    'uploaded_documents_fts': ('id', 'file_name', 'tg_file_id'),
+}
+_EXTRA_WHERE = {
+    'files_fts': '',
+    'uploaded_documents_fts': "t.status = 'approved'",
+}
+
+SEARCH_CACHE_TTL = 60     # 关键词结果数及翻页游标的缓存时间（秒）
+SEARCH_CACHE_SIZE = 256   # 最多缓存的关键词数量
+
+_index_ready = False
+# (索引名, 关键词) -> {'expires': 过期时间, 'total': 结果总数, 'cursors': {页码: 上一页最后一条的主键}}
+_page_cache = {}
+
+def _sqlite_create_index(conn, fts, table, key, column):
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {'name': fts}
+    ).first()
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='{key}', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{key}, new.{column}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{key}, new.{column}); END"
+    ))
+    if not exists:
+        # 首次创建时为已有数据建立索引
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        print(f"已创建全文索引: {fts}")
+
+def _mysql_create_index(conn, fts, table, column):
+    exists = conn.execute(text(f"SHOW INDEX FROM {table} WHERE Key_name = :name"), {'name': fts}).first()
+    if not exists:
+        conn.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {fts} ({column}) WITH PARSER ngram"))
+        print(f"已创建全文索引: {table}.{fts}")
+
+def init_search_index():
+    """创建全文索引（可重复执行），失败时搜索回退到 LIKE 查询"""
+    global _index_ready
+    try:
+        with engine.begin() as conn:
+            for fts, (table, key, column) in SEARCH_INDEXES.items():
+                if engine.dialect.name == 'sqlite':
+                    _sqlite_create_index(conn, fts, table, key, column)
+                else:
+                    _mysql_create_index(conn, fts, table, column)
+        _index_ready = True
+    except Exception as e:
+        _index_ready = False
+        print(f"全文索引不可用，搜索将使用 LIKE 查询: {e}")
+
+def _use_index(keyword):
+    if not _index_ready:
+        return False
+    min_len = SQLITE_MIN_KEYWORD_LEN if engine.dialect.name == 'sqlite' else MYSQL_MIN_KEYWORD_LEN
+    return len(keyword) >= min_len
+
+def _match_expr(keyword):
+    """把关键词转换为短语查询，避免用户输入被解析为检索语法"""
+    if engine.dialect.name == 'sqlite':
+        return '"' + keyword.replace('"', '""') + '"'
+    return '"' + keyword.replace('"', ' ') + '"'
+
+def _build_query(index_name, keyword, count=False, after_id=None, limit=None, offset=0):
+    """构建检索 SQL：结果按主键倒序（after_id 用于游标翻页）"""
+    table, key, column = SEARCH_INDEXES[index_name]
+    if _use_index(keyword):
+        params = {'q': _match_expr(keyword)}
+        if engine.dialect.name == 'sqlite':
+            source = f"{index_name} JOIN {table} t ON t.{key} = {index_name}.rowid"
+            where = [f"{index_name} MATCH :q"]
+        else:
+            source = f"{table} t"
+            where = [f"MATCH(t.{column}) AGAINST(:q IN BOOLEAN MODE)"]
+    else:
+        params = {'like': f"%{keyword}%"}
+        source = f"{table} t"
+        where = [f"t.{column} LIKE :like"]
+    if _EXTRA_WHERE[index_name]:
+        where.append(_EXTRA_WHERE[index_name])
+    if after_id is not None:
+        where.append(f"t.{key} < :after_id")
+        params['after_id'] = after_id
+    if count:
+        return text(f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(where)}"), params
+    columns = ', '.join('t.' + c for c in _RESULT_COLUMNS[index_name])
+    sql = f"SELECT {columns} FROM {source} WHERE {' AND '.join(where)} ORDER BY t.{key} DESC"
+    if limit is not None:
+        sql += ' LIMIT :limit OFFSET :offset'
+        params.update(limit=limit, offset=offset)
+    return text(sql), params
+
+def _count(index_name, keyword):
+    with SessionLocal() as session:
+        sql, params = _build_query(index_name, keyword, count=True)
+        return session.execute(sql, params).scalar()
+
+def _get_page_cache(index_name, keyword):
+    now = time.monotonic()
+    cache_key = (index_name, keyword)
+    entry = _page_cache.get(cache_key)
+    if entry and entry['expires'] > now:
+        return entry
+    if len(_page_cache) >= SEARCH_CACHE_SIZE:
+        for k in [k for k, v in _page_cache.items() if v['expires'] <= now]:
+            del _page_cache[k]
+        if len(_page_cache) >= SEARCH_CACHE_SIZE:
+            del _page_cache[next(iter(_page_cache))]
+    entry = {'expires': now + SEARCH_CACHE_TTL, 'total': _count(index_name, keyword), 'cursors': {}}
+    _page_cache[cache_key] = entry
+    return entry
+
+def _search_page(index_name, keyword, page, page_size):
+    """按主键倒序取一页结果，返回 (rows, total)
+
+    结果总数按关键词缓存；每取到一页就记下该页最后一条的主键作为下一页的游标，
+    顺序翻页时只需一次带 `主键 < 游标` 条件的索引查询，无游标时（直接跳页）才回退到 OFFSET。
+    """
+    entry = _get_page_cache(index_name, keyword)
+    if not entry['total']:
+        return [], 0
+    after_id = entry['cursors'].get(page) if page > 0 else None
+    offset = page * page_size if page > 0 and after_id is None else 0
+    with SessionLocal() as session:
+        sql, params = _build_query(index_name, keyword, after_id=after_id, limit=page_size, offset=offset)
+        rows = [tuple(row) for row in session.execute(sql, params)]
+    if len(rows) == page_size:
+        entry['cursors'][page + 1] = rows[-1][0]
+    return rows, entry['total']
+
+def search_files_page(keyword, page, page_size):
+    """按 file_id 倒序分页检索 files，返回 (当前页结果, 结果总数)"""
+    return _search_page('files_fts', keyword, page, page_size)
+
+def search_uploaded_documents_page(keyword, page, page_size):
+    """按 id 倒序分页检索已收录的上传文档，返回 (当前页结果, 结果总数)"""
+    return _search_page('uploaded_documents_fts', keyword, page, page_size)
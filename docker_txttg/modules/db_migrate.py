@@ -1,6 +1,7 @@
 from modules.db.orm_utils import get_engine, init_db
 from sqlalchemy import text, inspect
 from modules.db.orm_models import Base
+from modules.db.search_index import init_search_index
 
 def migrate_db():
     """数据库迁移工具"""
@@ -54,6 +55,25 @@ def migrate_db():
                 column_type = get_column_type(column)
                 add_column_if_not_exists(table_name, column_name, column_type)
 
+        # 为已存在的表补建模型中新增的索引
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+
+        # 首次创建 daily_usage 时根据 sent_files 回填每日计数
+        with engine.begin() as conn:
+            if conn.execute(text("SELECT COUNT(*) FROM daily_usage")).scalar() == 0:
+                result = conn.execute(text(
+                    "INSERT INTO daily_usage (user_id, date, count) "
+                    "SELECT user_id, date, COUNT(*) FROM sent_files "
+                    "WHERE date IS NOT NULL GROUP BY user_id, date"
+                ))
+                if result.rowcount:
+                    print(f"已回填每日领取计数: {result.rowcount} 条")
+
+        # 全文检索索引
+        init_search_index()
+
         print("数据库迁移完成")
     except Exception as e:
         print(f"迁移出错: {e}")
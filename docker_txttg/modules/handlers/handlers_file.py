@@ -6,8 +6,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime, timedelta
 import os
+import asyncio
 from modules.core.bot_tasks import send_file_job
-from modules.config.config import ADMIN_USER_ID, HOT_PAGE_SIZE
+from modules.config.config import ADMIN_USER_ID, HOT_PAGE_SIZE, RELOAD_PROGRESS_INTERVAL
 
 async def send_random_txt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -55,8 +56,33 @@ async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id not in ADMIN_USER_ID:
         await update.message.reply_text('无权限，仅管理员可用。')
         return
-    inserted, skipped = reload_txt_files()
-    await update.message.reply_text(f'刷新完成，新增 {inserted} 个文件，跳过 {skipped} 个已存在。')
+    full = bool(context.args) and context.args[0] == 'full'
+    status_message = await update.message.reply_text('正在扫描文件...')
+    progress = {}
+    task = asyncio.create_task(asyncio.to_thread(reload_txt_files, progress.update, full))
+    last_text = None
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=RELOAD_PROGRESS_INTERVAL)
+        if done:
+            break
+        text = (f'正在扫描文件...\n已扫描 {progress.get("scanned", 0)} 个，新增 {progress.get("inserted", 0)} 个，'
+                f'更新 {progress.get("updated", 0)} 个，删除 {progress.get("deleted", 0)} 个')
+        if text != last_text:
+            try:
+                await status_message.edit_text(text)
+                last_text = text
+            except Exception:
+                pass
+    try:
+        result = task.result()
+    except Exception as e:
+        await status_message.edit_text(f'刷新失败: {e}')
+        return
+    text = (f'刷新完成，共扫描 {result["scanned"]} 个文件：新增 {result["inserted"]} 个，更新 {result["updated"]} 个，'
+            f'删除 {result["deleted"]} 个，跳过 {result["skipped"]} 个未变化。')
+    if result['held']:
+        text += f'\n有 {result["held"]} 个记录对应的文件已不存在，数量过多未删除；确认目录无误后请执行 /reload full。'
+    await status_message.edit_text(text)
 
 
 async def hot(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -71,28 +97,7 @@ async def hot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await send_hot_page(update, context, page=page, edit=True)
 
 async def send_hot_page(update, context, page=0, edit=False):
-    with SessionLocal() as session:
-        from sqlalchemy import func
-        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        likes_subq = session.query(
-            FileFeedback.file_id,
-            func.count().label('likes')
-        ).filter(
-            FileFeedback.feedback == 1,
-            FileFeedback.date >= seven_days_ago
-        ).group_by(FileFeedback.file_id).subquery()
-        rows = (
-            session.query(
-                File.file_path,
-                File.tg_file_id,
-                func.coalesce(likes_subq.c.likes, 0)
-            )
-            .outerjoin(likes_subq, File.file_id == likes_subq.c.file_id)
-            .filter(likes_subq.c.likes != None)
-            .order_by(likes_subq.c.likes.desc(), File.file_path)
-            .all()
-        )
-    total = len(rows)
+    page_rows, total = get_hot_page(page, HOT_PAGE_SIZE)
     if total == 0:
         msg = '最近7天还没有文件收到，快去评分吧！'
         if edit and update.callback_query:
@@ -102,7 +107,6 @@ async def send_hot_page(update, context, page=0, edit=False):
         return
     start = page * HOT_PAGE_SIZE
     end = start + HOT_PAGE_SIZE
-    page_rows = rows[start:end]
     msg = '🔥 <b>热榜（近7天👍最多的文件）</b> 🔥\n\n'
     for idx, (file_path, tg_file_id, likes) in enumerate(page_rows, start+1):
         filename = os.path.basename(file_path)
@@ -54,7 +54,7 @@ def get_help_text():
         
         "admin_commands": (
             "\n<b>管理员命令：</b>\n"
-            "    /reload - 重新加载文件列表\n"
+            "    /reload [full] - 重新加载文件列表（默认跳过未变化的目录，不会发现原地改写的文件；full 为完整扫描，大批量删除也需 full 确认）\n"
             "    /setvip - 设置用户VIP状态\n"
             "    /setviplevel - 设置用户VIP等级\n"
             "    /batchapprove - 批量批准上传的文件\n"
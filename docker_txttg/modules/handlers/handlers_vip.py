@@ -51,6 +51,7 @@ async def setvip_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user.vip_expiry_date = None
             await update.message.reply_text(f'用户 {target_id} VIP状态已取消')
         session.commit()
+    invalidate_user_cache(target_id)
 
 async def setviplevel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -79,6 +80,7 @@ async def setviplevel_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             if remaining_days >= 30:
                 user.vip_level = vip_level
                 session.commit()
+                invalidate_user_cache(target_id)
                 await update.message.reply_text(f'用户 {target_id} VIP等级已更新为 {vip_level}，过期时间保持不变')
                 return
     set_user_vip_level(target_id, vip_level)
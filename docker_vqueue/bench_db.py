@@ -0,0 +1,73 @@
+"""数据库连接微基准：对比每次操作新建连接（旧 get_db 写法）与连接池的 ops/s
+
+用法: python bench_db.py [每项次数，默认 5000]
+在临时目录中建库测试，不会读写 data/ 下的数据库。
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlite_pool import ConnectionPool
+
+
+def connect_per_call(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def point_read(get_conn, i):
+    conn = get_conn()
+    try:
+        conn.execute("SELECT * FROM users WHERE user_id = ?", (i % 1000,)).fetchone()
+    finally:
+        conn.close()
+
+
+def single_write(get_conn, i):
+    conn = get_conn()
+    try:
+        conn.execute(
+            "INSERT INTO send_log (queue_id, to_user_id, status, created_at) VALUES (?, ?, 'sent', '')",
+            (1, i)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def measure(op, get_conn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        op(get_conn, i)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = connect_per_call(path)
+        conn.executescript('''
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, status TEXT);
+            CREATE TABLE send_log (id INTEGER PRIMARY KEY AUTOINCREMENT, queue_id INTEGER,
+                                   to_user_id INTEGER, status TEXT, created_at TEXT);
+        ''')
+        conn.executemany("INSERT INTO users VALUES (?, ?, 'active')", [(i, f'u{i}') for i in range(1000)])
+        conn.commit()
+        conn.close()
+
+        pool = ConnectionPool(path)
+        print(f"{'操作':<10}{'每次新建连接':>16}{'连接池':>16}{'提升':>10}")
+        for name, op in (('点查询', point_read), ('单行写入', single_write)):
+            before = measure(op, lambda: connect_per_call(path), n)
+            after = measure(op, pool.acquire, n)
+            print(f"{name:<10}{before:>13.0f} ops/s{after:>10.0f} ops/s{after / before:>9.1f}x")
+        pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,8 @@ import glob
 from Cython.Build import cythonize
 from setuptools import setup, Extension
 
-# 入口文件和构建脚本不编译
-EXCLUDE_FILES = {"main.py", "build.py"}
+# 入口文件、构建脚本和基准脚本不编译
+EXCLUDE_FILES = {"main.py", "build.py", "bench_db.py"}
 
 
 def get_extensions():
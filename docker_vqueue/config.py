@@ -18,12 +18,26 @@ ADMIN_IDS = [int(x) for x in os.environ.get('ADMIN_IDS', '').split(',') if x.str
 
 # 数据库
 DB_PATH = './data/vqueue.db'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))              # 连接池保留的空闲连接数
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', '16384'))  # 每个连接的页缓存（KB）
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', '134217728'))      # 内存映射读取上限（字节）
 
 # 发送控制
-SEND_CONCURRENCY = int(os.environ.get('SEND_CONCURRENCY', '10'))    # 并发发送用户数（同时发给N个用户）
-BATCH_INTERVAL = float(os.environ.get('BATCH_INTERVAL', '1.0'))     # 每批发完后间隔（秒）
+SEND_CONCURRENCY = int(os.environ.get('SEND_CONCURRENCY', '10'))    # 同时在途的发送数（worker 数）
+SEND_RATE = float(os.environ.get('SEND_RATE', '25'))                # 全局发送速率（条/秒），Telegram 上限约 30
+SEND_BURST = float(os.environ.get('SEND_BURST', '5'))               # 令牌桶容量（允许的瞬时突发条数）
+PER_CHAT_INTERVAL = float(os.environ.get('PER_CHAT_INTERVAL', '1.0'))  # 同一聊天两次发送的最小间隔（秒）
+SEND_RETRIES = int(os.environ.get('SEND_RETRIES', '3'))             # 遇到 RetryAfter 时的最大重试次数
 VIDEO_INTERVAL = int(os.environ.get('VIDEO_INTERVAL', '5'))         # 不同组之间间隔（秒）
 
+# 广播任务断点续发
+BROADCAST_BATCH_SIZE = int(os.environ.get('BROADCAST_BATCH_SIZE', '200'))  # 每次领取的接收者数
+BROADCAST_LEASE = int(os.environ.get('BROADCAST_LEASE', '600'))            # 领取租约（秒），超时未完成的接收者会被重新领取
+
+# 发送结果批量写入：攒满 N 条或间隔 T 秒写一次
+WRITE_BATCH_ROWS = int(os.environ.get('WRITE_BATCH_ROWS', '500'))
+WRITE_FLUSH_INTERVAL = float(os.environ.get('WRITE_FLUSH_INTERVAL', '0.5'))  # 秒
+
 # 转发保护（防止接收者转发/保存）
 PROTECT_CONTENT = os.environ.get('PROTECT_CONTENT', 'true').lower() == 'true'
 
@@ -1,21 +1,48 @@
 """数据库操作模块"""
-import sqlite3
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 
-from config import DB_PATH
-from models import UserStatus, QueueStatus
+from config import (
+    DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, WRITE_BATCH_ROWS, WRITE_FLUSH_INTERVAL,
+    MIN_VIDEOS_24H
+)
+from models import UserStatus, QueueStatus, RecipientStatus
+from roster import ActiveRoster
+from sqlite_pool import ConnectionPool
+from write_buffer import WriteBuffer
 
 logger = logging.getLogger(__name__)
 
+_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE)
+
 
 def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """从连接池借出数据库连接，close() 时归还"""
+    return _pool.acquire()
+
+
+def _load_active_ids():
+    conn = get_db()
+    try:
+        return [r['user_id'] for r in conn.execute(
+            "SELECT user_id FROM users WHERE status = ?", (UserStatus.ACTIVE,)
+        )]
+    finally:
+        conn.close()
+
+
+# 活跃用户名单（内存），由下面修改用户状态的函数同步维护
+active_roster = ActiveRoster(_load_active_ids)
+
+
+def close_db():
+    """关闭连接池中的空闲连接"""
+    _pool.close_all()
+
+
+# 广播发送结果写缓冲（send_log、接收者检查点）
+_send_writes = WriteBuffer(get_db, WRITE_BATCH_ROWS, WRITE_FLUSH_INTERVAL)
 
 
 def init_db():
@@ -49,6 +76,7 @@ def init_db():
             );
             CREATE INDEX IF NOT EXISTS idx_vq_status ON video_queue(status);
             CREATE INDEX IF NOT EXISTS idx_vq_group ON video_queue(group_id);
+            CREATE INDEX IF NOT EXISTS idx_vq_pending ON video_queue(status, created_at, group_id);
 
             CREATE TABLE IF NOT EXISTS send_log (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -58,7 +86,46 @@ def init_db():
                 created_at TEXT
             );
             CREATE INDEX IF NOT EXISTS idx_sl_user ON send_log(to_user_id);
+
+            CREATE TABLE IF NOT EXISTS contributions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_contrib_user ON contributions(user_id, created_at);
+
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_id TEXT NOT NULL,
+                queue_ids TEXT NOT NULL,
+                status TEXT DEFAULT 'sending',
+                total INTEGER DEFAULT 0,
+                sent INTEGER DEFAULT 0,
+                blocked INTEGER DEFAULT 0,
+                skipped INTEGER DEFAULT 0,
+                created_at TEXT,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_bj_status ON broadcast_jobs(status);
+
+            CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                job_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT DEFAULT 'pending',
+                lease_until TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (job_id, user_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_br_status ON broadcast_recipients(job_id, status);
         ''')
+        # 首次启用投稿日志时，用队列中最近 24 小时的投稿补齐（每组计一次）
+        if not conn.execute("SELECT 1 FROM contributions LIMIT 1").fetchone():
+            conn.execute(
+                """INSERT INTO contributions (user_id, created_at)
+                   SELECT from_user_id, MIN(created_at) FROM video_queue
+                   WHERE created_at >= ? GROUP BY group_id""",
+                (_window_start(),)
+            )
         conn.commit()
         logger.info("数据库初始化完成")
     finally:
@@ -90,17 +157,25 @@ def register_user(user_id: int, username: str = "") -> bool:
             (user_id, username, UserStatus.ACTIVE, now, now, now)
         )
         conn.commit()
+        active_roster.add(user_id)
         return True
     finally:
         conn.close()
 
 
 def get_user(user_id: int) -> Optional[Dict]:
-    """获取用户信息"""
+    """获取用户信息（video_count_24h 为最近 24 小时的实时投稿数）"""
     conn = get_db()
     try:
         row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
-        return dict(row) if row else None
+        if not row:
+            return None
+        user = dict(row)
+        user['video_count_24h'] = conn.execute(
+            "SELECT COUNT(*) as c FROM contributions WHERE user_id = ? AND created_at >= ?",
+            (user_id, _window_start())
+        ).fetchone()['c']
+        return user
     finally:
         conn.close()
 
@@ -115,74 +190,60 @@ def update_user_status(user_id: int, status: str):
             (status, now, user_id)
         )
         conn.commit()
+        active_roster.set_active(user_id, status == UserStatus.ACTIVE)
     finally:
         conn.close()
 
 
-def get_active_users() -> List[Dict]:
-    """获取所有活跃用户"""
-    conn = get_db()
-    try:
-        rows = conn.execute(
-            "SELECT * FROM users WHERE status = ? ORDER BY user_id",
-            (UserStatus.ACTIVE,)
-        ).fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+def _window_start() -> str:
+    """24 小时滑动窗口的起点"""
+    return (datetime.now() - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
 
 
 def increment_video_count(user_id: int):
-    """增加用户24h视频计数"""
+    """记录一次投稿（写入 contributions 日志，24h 发送数按时间窗口实时统计）"""
     conn = get_db()
     try:
-        conn.execute(
-            "UPDATE users SET video_count_24h = video_count_24h + 1, last_active_at = ? WHERE user_id = ?",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user_id)
-        )
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("INSERT INTO contributions (user_id, created_at) VALUES (?, ?)", (user_id, now))
+        conn.execute("UPDATE users SET last_active_at = ? WHERE user_id = ?", (now, user_id))
         conn.commit()
     finally:
         conn.close()
 
 
-def check_and_reset_24h_counts() -> List[int]:
-    """检查24h活跃度，重置计数，返回需要系统停止的用户ID列表"""
+def stop_inactive_users() -> List[int]:
+    """停止最近 24 小时投稿不足 MIN_VIDEOS_24H 个的活跃用户（注册不满 24 小时的新用户除外），返回被停止的用户ID列表
+
+    按 contributions 日志做滑动窗口统计：一次聚合查出不活跃用户、一次批量更新，并清理窗口外的日志。
+    """
     conn = get_db()
     try:
-        now = datetime.now()
-        cutoff = now - timedelta(hours=24)
-        cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
-
-        # 找出不活跃的用户（24h内发送不足 MIN_VIDEOS_24H 个视频且当前为active）
-        from config import MIN_VIDEOS_24H
-        inactive_users = conn.execute(
-            """SELECT user_id FROM users
-               WHERE status = ? AND video_count_24h < ?""",
-            (UserStatus.ACTIVE, MIN_VIDEOS_24H)
+        cutoff = _window_start()
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """SELECT u.user_id FROM users u
+               LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM contributions
+                          WHERE created_at >= ? GROUP BY user_id) c ON c.user_id = u.user_id
+               WHERE u.status = ? AND COALESCE(c.n, 0) < ?
+                 AND (u.registered_at IS NULL OR u.registered_at = '' OR u.registered_at <= ?)""",
+            (cutoff, UserStatus.ACTIVE, MIN_VIDEOS_24H, cutoff)
         ).fetchall()
+        stopped_ids = [r['user_id'] for r in rows]
 
-        stopped_ids = []
-        now_str = now.strftime("%Y-%m-%d %H:%M:%S")
-
-        for row in inactive_users:
-            uid = row['user_id']
-            # 检查注册时间是否超过24小时（新用户给24小时宽限期）
-            user = conn.execute("SELECT registered_at FROM users WHERE user_id = ?", (uid,)).fetchone()
-            if user and user['registered_at']:
-                reg_time = datetime.strptime(user['registered_at'], "%Y-%m-%d %H:%M:%S")
-                if reg_time > cutoff:
-                    continue  # 新用户不足24小时，跳过
-
+        for i in range(0, len(stopped_ids), 500):
+            chunk = stopped_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
             conn.execute(
-                "UPDATE users SET status = ?, video_count_24h = 0, updated_at = ? WHERE user_id = ?",
-                (UserStatus.SYSTEM_STOPPED, now_str, uid)
+                f"UPDATE users SET status = ?, updated_at = ? WHERE user_id IN ({placeholders})",
+                [UserStatus.SYSTEM_STOPPED, now_str] + chunk
             )
-            stopped_ids.append(uid)
 
-        # 重置所有用户的24h计数
-        conn.execute("UPDATE users SET video_count_24h = 0")
+        conn.execute("DELETE FROM contributions WHERE created_at < ?", (cutoff,))
         conn.commit()
-
+        for uid in stopped_ids:
+            active_roster.discard(uid)
         return stopped_ids
     finally:
         conn.close()
@@ -214,103 +275,256 @@ def add_to_queue(from_user_id: int, from_username: str,
         conn.close()
 
 
-def get_next_pending_group() -> Optional[Dict]:
-    """获取下一个待发送的组（返回组信息，包含所有媒体）"""
+def _pending_group(conn) -> Optional[Dict]:
+    """取最早的待发送组：最早的 pending 记录所在的组即 MIN(created_at) 最小的组，走 idx_vq_pending 一次索引查找"""
+    head = conn.execute(
+        "SELECT group_id FROM video_queue WHERE status = ? ORDER BY created_at ASC LIMIT 1",
+        (QueueStatus.PENDING,)
+    ).fetchone()
+    if not head:
+        return None
+
+    # 获取该组的所有媒体
+    items = conn.execute(
+        """SELECT * FROM video_queue WHERE group_id = ? AND status = ?
+           ORDER BY sort_order ASC, id ASC""",
+        (head['group_id'], QueueStatus.PENDING)
+    ).fetchall()
+    if not items:
+        return None
+
+    return {
+        'group_id': head['group_id'],
+        'from_user_id': items[0]['from_user_id'],
+        'from_username': items[0]['from_username'] or '',
+        'items': [dict(r) for r in items]
+    }
+
+
+def get_queue_stats() -> Dict:
+    """获取队列统计"""
     conn = get_db()
     try:
-        # 找到最早的一个pending组
-        row = conn.execute(
-            """SELECT group_id, from_user_id, from_username, MIN(created_at) as first_created
-               FROM video_queue WHERE status = ? GROUP BY group_id
-               ORDER BY first_created ASC LIMIT 1""",
+        pending = conn.execute(
+            "SELECT COUNT(DISTINCT group_id) as c FROM video_queue WHERE status = ?",
             (QueueStatus.PENDING,)
-        ).fetchone()
-
-        if not row:
-            return None
-
-        group_id = row['group_id']
-
-        # 获取该组的所有媒体
-        items = conn.execute(
-            """SELECT * FROM video_queue WHERE group_id = ? AND status = ?
-               ORDER BY sort_order ASC, id ASC""",
-            (group_id, QueueStatus.PENDING)
-        ).fetchall()
+        ).fetchone()['c']
 
-        if not items:
-            return None
+        total_users = conn.execute("SELECT COUNT(*) as c FROM users").fetchone()['c']
+        active_users = len(active_roster)
 
         return {
-            'group_id': group_id,
-            'from_user_id': row['from_user_id'],
-            'from_username': row['from_username'] or '',
-            'items': [dict(r) for r in items]
+            'pending_groups': pending,
+            'total_users': total_users,
+            'active_users': active_users,
         }
     finally:
         conn.close()
 
-
-def update_queue_status(queue_ids: list, status: str):
-    """更新队列项状态"""
+# ===================== 广播任务（断点续发） =====================
+
+def _now_str(offset_seconds: int = 0) -> str:
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _load_job(conn, job_row) -> Dict:
+    """组装广播任务信息：任务字段 + 该任务包含的媒体"""
+    queue_ids = [int(x) for x in job_row['queue_ids'].split(',') if x]
+    placeholders = ','.join('?' * len(queue_ids))
+    items = conn.execute(
+        f"SELECT * FROM video_queue WHERE id IN ({placeholders}) ORDER BY sort_order ASC, id ASC",
+        queue_ids
+    ).fetchall() if queue_ids else []
+    first = items[0] if items else None
+    return {
+        'id': job_row['id'],
+        'group_id': job_row['group_id'],
+        'queue_ids': queue_ids,
+        'total': job_row['total'],
+        'from_user_id': first['from_user_id'] if first else 0,
+        'from_username': (first['from_username'] or '') if first else '',
+        'items': [dict(r) for r in items],
+    }
+
+
+def claim_next_group() -> Optional[Dict]:
+    """原子领取下一个待发送组并创建广播任务，没有待发送组时返回 None
+
+    在同一个 IMMEDIATE 事务中取组、写入任务和全部接收者（当前活跃用户，排除来源用户）并把队列项标记为发送中，
+    多个进程同时轮询也不会重复领取同一组。
+    """
     conn = get_db()
     try:
+        conn.execute("BEGIN IMMEDIATE")
+        group = _pending_group(conn)
+        if not group:
+            conn.rollback()
+            return None
+
+        now = _now_str()
+        queue_ids = [item['id'] for item in group['items']]
+        cur = conn.execute(
+            """INSERT INTO broadcast_jobs (group_id, queue_ids, status, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            (group['group_id'], ','.join(map(str, queue_ids)), QueueStatus.SENDING, now, now)
+        )
+        job_id = cur.lastrowid
+        total = conn.execute(
+            """INSERT INTO broadcast_recipients (job_id, user_id, status, updated_at)
+               SELECT ?, user_id, ?, ? FROM users WHERE status = ? AND user_id != ?""",
+            (job_id, RecipientStatus.PENDING, now, UserStatus.ACTIVE, group['from_user_id'])
+        ).rowcount
+        conn.execute("UPDATE broadcast_jobs SET total = ? WHERE id = ?", (total, job_id))
         placeholders = ','.join('?' * len(queue_ids))
         conn.execute(
             f"UPDATE video_queue SET status = ? WHERE id IN ({placeholders})",
-            [status] + queue_ids
+            [QueueStatus.SENDING] + queue_ids
         )
         conn.commit()
+        job = conn.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,)).fetchone()
+        return _load_job(conn, job)
     finally:
         conn.close()
 
 
-def increment_sent_count(queue_ids: list):
-    """增加已发送计数"""
+def get_unfinished_job() -> Optional[Dict]:
+    """获取最早一个未完成的广播任务（重启后从这里续发）"""
     conn = get_db()
     try:
-        placeholders = ','.join('?' * len(queue_ids))
-        conn.execute(
-            f"UPDATE video_queue SET sent_count = sent_count + 1 WHERE id IN ({placeholders})",
-            queue_ids
-        )
-        conn.commit()
+        job = conn.execute(
+            "SELECT * FROM broadcast_jobs WHERE status = ? ORDER BY id ASC LIMIT 1",
+            (QueueStatus.SENDING,)
+        ).fetchone()
+        return _load_job(conn, job) if job else None
     finally:
         conn.close()
 
 
-def log_send(queue_id: int, to_user_id: int, status: str = "sent"):
-    """记录发送日志"""
+def claim_recipients(job_id: int, limit: int, lease_seconds: int) -> List[int]:
+    """原子领取一批待发送的接收者并设置租约
+
+    可领取：未发送的，或租约已过期仍处于发送中的（上次运行中断）；只领取当前仍为活跃状态的用户。
+    """
     conn = get_db()
     try:
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn.execute(
-            "INSERT INTO send_log (queue_id, to_user_id, status, created_at) VALUES (?, ?, ?, ?)",
-            (queue_id, to_user_id, status, now)
-        )
+        now = _now_str()
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """SELECT r.user_id FROM broadcast_recipients r
+               JOIN users u ON u.user_id = r.user_id
+               WHERE r.job_id = ? AND u.status = ?
+                 AND (r.status = ? OR (r.status = ? AND r.lease_until < ?))
+               ORDER BY r.user_id LIMIT ?""",
+            (job_id, UserStatus.ACTIVE, RecipientStatus.PENDING, RecipientStatus.SENDING, now, limit)
+        ).fetchall()
+        user_ids = [r['user_id'] for r in rows]
+        if user_ids:
+            placeholders = ','.join('?' * len(user_ids))
+            conn.execute(
+                f"""UPDATE broadcast_recipients SET status = ?, lease_until = ?, updated_at = ?
+                    WHERE job_id = ? AND user_id IN ({placeholders})""",
+                [RecipientStatus.SENDING, _now_str(lease_seconds), now, job_id] + user_ids
+            )
         conn.commit()
+        return user_ids
     finally:
         conn.close()
 
 
-def get_queue_stats() -> Dict:
-    """获取队列统计"""
+def record_send_result(queue_id: int, job_id: int, user_id: int, success: bool):
+    """缓冲写入单个接收者的发送结果（send_log + 检查点），失败时直接标记用户为 system_stopped"""
+    now = _now_str()
+    status = RecipientStatus.SENT if success else RecipientStatus.BLOCKED
+    _send_writes.add(
+        "INSERT INTO send_log (queue_id, to_user_id, status, created_at) VALUES (?, ?, ?, ?)",
+        (queue_id, user_id, status, now)
+    )
+    _send_writes.add(
+        "UPDATE broadcast_recipients SET status = ?, lease_until = NULL, updated_at = ? WHERE job_id = ? AND user_id = ?",
+        (status, now, job_id, user_id)
+    )
+    if not success:
+        # 用户状态直接写库，不经缓冲：避免缓冲中的旧状态覆盖随后 /resume 或管理员恢复的状态
+        update_user_status(user_id, UserStatus.SYSTEM_STOPPED)
+
+
+async def flush_writes():
+    """立即写入缓冲中的发送结果"""
+    await _send_writes.flush()
+
+
+def finish_broadcast_job(job_id: int) -> Optional[Dict]:
+    """结束广播任务：汇总结果、标记队列完成并清理接收者记录
+
+    仍有未过期租约的接收者时不结束，返回 None；否则返回 {'total', 'sent', 'blocked', 'skipped'}。
+    """
     conn = get_db()
     try:
-        pending = conn.execute(
-            "SELECT COUNT(DISTINCT group_id) as c FROM video_queue WHERE status = ?",
-            (QueueStatus.PENDING,)
-        ).fetchone()['c']
-
-        total_users = conn.execute("SELECT COUNT(*) as c FROM users").fetchone()['c']
-        active_users = conn.execute(
-            "SELECT COUNT(*) as c FROM users WHERE status = ?", (UserStatus.ACTIVE,)
+        now = _now_str()
+        conn.execute("BEGIN IMMEDIATE")
+        leased = conn.execute(
+            "SELECT COUNT(*) as c FROM broadcast_recipients WHERE job_id = ? AND status = ? AND lease_until >= ?",
+            (job_id, RecipientStatus.SENDING, now)
         ).fetchone()['c']
+        if leased:
+            conn.rollback()
+            return None
 
-        return {
-            'pending_groups': pending,
-            'total_users': total_users,
-            'active_users': active_users,
+        # 剩余未发送的接收者已不再活跃
+        conn.execute(
+            "UPDATE broadcast_recipients SET status = ? WHERE job_id = ? AND status IN (?, ?)",
+            (RecipientStatus.SKIPPED, job_id, RecipientStatus.PENDING, RecipientStatus.SENDING)
+        )
+        counts = {r['status']: r['c'] for r in conn.execute(
+            "SELECT status, COUNT(*) as c FROM broadcast_recipients WHERE job_id = ? GROUP BY status",
+            (job_id,)
+        )}
+        summary = {
+            'total': sum(counts.values()),
+            'sent': counts.get(RecipientStatus.SENT, 0),
+            'blocked': counts.get(RecipientStatus.BLOCKED, 0),
+            'skipped': counts.get(RecipientStatus.SKIPPED, 0),
         }
+        conn.execute(
+            """UPDATE broadcast_jobs SET status = ?, sent = ?, blocked = ?, skipped = ?, updated_at = ?
+               WHERE id = ?""",
+            (QueueStatus.DONE, summary['sent'], summary['blocked'], summary['skipped'], now, job_id)
+        )
+        job = conn.execute("SELECT queue_ids FROM broadcast_jobs WHERE id = ?", (job_id,)).fetchone()
+        queue_ids = [int(x) for x in job['queue_ids'].split(',') if x]
+        if queue_ids:
+            placeholders = ','.join('?' * len(queue_ids))
+            conn.execute(
+                f"UPDATE video_queue SET status = ?, sent_count = sent_count + 1 WHERE id IN ({placeholders})",
+                [QueueStatus.DONE] + queue_ids
+            )
+        # 逐用户记录已写入 send_log，任务结束后只保留汇总
+        conn.execute("DELETE FROM broadcast_recipients WHERE job_id = ?", (job_id,))
+        conn.commit()
+        return summary
+    finally:
+        conn.close()
+
+
+def recover_broadcasts() -> Dict:
+    """启动时恢复：未完成的广播任务留待续发；不属于任何未完成任务的 sending 队列项（旧版本中断遗留）重置为 pending"""
+    conn = get_db()
+    try:
+        jobs = conn.execute(
+            "SELECT queue_ids FROM broadcast_jobs WHERE status = ?", (QueueStatus.SENDING,)
+        ).fetchall()
+        owned = {int(x) for job in jobs for x in job['queue_ids'].split(',') if x}
+        stuck = [r['id'] for r in conn.execute(
+            "SELECT id FROM video_queue WHERE status = ?", (QueueStatus.SENDING,)
+        ) if r['id'] not in owned]
+        for i in range(0, len(stuck), 500):
+            chunk = stuck[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            conn.execute(
+                f"UPDATE video_queue SET status = ? WHERE id IN ({placeholders})",
+                [QueueStatus.PENDING] + chunk
+            )
+        conn.commit()
+        return {'unfinished_jobs': len(jobs), 'reset_items': len(stuck)}
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
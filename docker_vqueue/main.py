@@ -8,7 +8,7 @@ from telegram.ext import (
 )
 
 from config import BOT_TOKEN
-from database import init_db
+from database import init_db, recover_broadcasts, flush_writes, close_db, active_roster
 from handlers import (
     cmd_start, cmd_stop, cmd_resume, cmd_status, cmd_stats,
     handle_video, handle_photo, handle_media_group
@@ -53,18 +53,30 @@ async def post_init(application):
     logger.info("Bot 已初始化，注册了 %d 个命令", len(commands))
 
 
+async def post_shutdown(application):
+    """退出前写入缓冲中的发送结果并关闭数据库连接"""
+    await flush_writes()
+    close_db()
+
+
 def main():
     if not BOT_TOKEN:
         print("❌ 错误: 未设置 BOT_TOKEN 环境变量")
         return
 
     init_db()
+    logger.info("已加载活跃用户名单: %d 人", active_roster.load())
+    recovered = recover_broadcasts()
+    if recovered['unfinished_jobs'] or recovered['reset_items']:
+        logger.info("恢复广播: %d 个未完成任务待续发，%d 个中断的队列项已重置为待发送",
+                    recovered['unfinished_jobs'], recovered['reset_items'])
     logger.info("视频队列分发 Bot 启动中...")
 
     application = (
         ApplicationBuilder()
         .token(BOT_TOKEN)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -16,6 +16,15 @@ class QueueStatus(str, Enum):
     DONE = "done"          # 已发送完成
 
 
+class RecipientStatus(str, Enum):
+    """广播任务中单个接收者的状态（断点续发用）"""
+    PENDING = "pending"    # 未发送
+    SENDING = "sending"    # 已领取，租约到期前视为发送中
+    SENT = "sent"          # 已发送
+    BLOCKED = "blocked"    # 发送失败（拉黑）
+    SKIPPED = "skipped"    # 任务结束时已不再活跃，跳过
+
+
 # 状态显示文案
 STATUS_TEXT = {
     UserStatus.ACTIVE: "✅ 正常接收中",
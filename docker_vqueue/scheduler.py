@@ -3,7 +3,7 @@ import logging
 
 from telegram.ext import ContextTypes
 
-from database import check_and_reset_24h_counts
+from database import stop_inactive_users
 from sender import process_queue
 
 from config import ACTIVE_CHECK_INTERVAL, QUEUE_CHECK_INTERVAL
@@ -12,9 +12,9 @@ logger = logging.getLogger(__name__)
 
 
 async def job_active_check(context: ContextTypes.DEFAULT_TYPE):
-    """定时检查用户24h活跃度"""
+    """定时检查用户最近24h的投稿数（滑动窗口）"""
     logger.info("开始24小时活跃度检查...")
-    stopped_ids = check_and_reset_24h_counts()
+    stopped_ids = stop_inactive_users()
 
     if stopped_ids:
         logger.info("以下用户因不活跃被系统停止: %s", stopped_ids)
@@ -6,12 +6,15 @@ from typing import List, Dict
 from telegram.ext import ContextTypes
 from telegram import InputMediaVideo, InputMediaPhoto
 
-from config import SEND_CONCURRENCY, BATCH_INTERVAL, VIDEO_INTERVAL, PROTECT_CONTENT, SHOW_SOURCE, SOURCE_FORMAT
+from broadcaster import rate_limited, broadcast
+from config import (
+    SEND_CONCURRENCY, SEND_RATE, VIDEO_INTERVAL, PROTECT_CONTENT, SHOW_SOURCE, SOURCE_FORMAT,
+    BROADCAST_BATCH_SIZE, BROADCAST_LEASE
+)
 from database import (
-    get_next_pending_group, get_active_users, update_queue_status,
-    increment_sent_count, log_send, update_user_status
+    claim_next_group, get_unfinished_job,
+    claim_recipients, record_send_result, flush_writes, finish_broadcast_job
 )
-from models import QueueStatus, UserStatus
 
 logger = logging.getLogger(__name__)
 
@@ -42,15 +45,15 @@ async def send_single_media(
 
     try:
         if file_type == 'video':
-            await bot.send_video(
+            await rate_limited(chat_id, lambda: bot.send_video(
                 chat_id=chat_id, video=file_id,
                 caption=caption, protect_content=protect
-            )
+            ))
         else:
-            await bot.send_photo(
+            await rate_limited(chat_id, lambda: bot.send_photo(
                 chat_id=chat_id, photo=file_id,
                 caption=caption, protect_content=protect
-            )
+            ))
         return True
     except Exception as e:
         error_str = str(e)
@@ -88,9 +91,9 @@ async def send_media_group_to_user(
         return 0
 
     try:
-        await bot.send_media_group(
+        await rate_limited(chat_id, lambda: bot.send_media_group(
             chat_id=chat_id, media=media_list, protect_content=protect
-        )
+        ), cost=len(media_list))
         return len(media_list)
     except Exception as e:
         logger.error("发送媒体组到 %s 失败: %s，尝试逐个发送", chat_id, e)
@@ -104,82 +107,71 @@ async def send_media_group_to_user(
 
 
 async def _send_to_user(bot, user_id: int, items: List[Dict],
-                        caption: str, protect: bool, queue_id: int) -> tuple:
-    """发送媒体给单个用户，返回 (user_id, success)"""
+                        caption: str, protect: bool, queue_id: int, job_id: int) -> tuple:
+    """发送媒体给单个用户，结果进入写缓冲，返回 (user_id, success)"""
     sent = await send_media_group_to_user(bot, user_id, items, caption, protect)
 
+    record_send_result(queue_id, job_id, user_id, sent > 0)
     if sent == 0:
-        update_user_status(user_id, UserStatus.SYSTEM_STOPPED)
-        log_send(queue_id, user_id, "blocked")
         logger.warning("用户 %s 发送失败，标记为 system_stopped", user_id)
         return (user_id, False)
-    else:
-        log_send(queue_id, user_id, "sent")
-        return (user_id, True)
+    return (user_id, True)
 
 
 async def process_queue(context: ContextTypes.DEFAULT_TYPE):
-    """处理队列：取一组 → 并发分批发送给所有活跃用户"""
-    group = get_next_pending_group()
-    if not group:
-        return
-
-    group_id = group['group_id']
-    from_user_id = group['from_user_id']
-    from_username = group['from_username']
-    items = group['items']
-    queue_ids = [item['id'] for item in items]
-
-    # 构建来源caption
-    original_caption = items[0].get('caption', '') or ''
-    caption = build_caption(original_caption, from_user_id, from_username)
-
-    # 标记为发送中
-    update_queue_status(queue_ids, QueueStatus.SENDING)
+    """处理队列：优先续发未完成的广播任务，否则取下一组创建任务；按批领取接收者经限速引擎发送"""
+    job = get_unfinished_job()
+    resumed = job is not None
+    if not resumed:
+        job = claim_next_group()
+        if not job:
+            return
+
+    job_id = job['id']
+    group_id = job['group_id']
+    items = job['items']
+
+    if items and job['total']:
+        # 构建来源caption
+        original_caption = items[0].get('caption', '') or ''
+        caption = build_caption(original_caption, job['from_user_id'], job['from_username'])
+
+        if not resumed:
+            logger.info("开始发送组 %s (%d个媒体) 给 %d 个用户，并发数=%d，速率=%s条/秒",
+                        group_id, len(items), job['total'], SEND_CONCURRENCY, SEND_RATE)
+
+        protect = PROTECT_CONTENT
+        queue_id = job['queue_ids'][0]
+
+        # 每批领取的接收者带租约，发送结果逐个写入检查点；进程中断后未完成的接收者在租约过期后被重新领取
+        while True:
+            user_ids = claim_recipients(job_id, BROADCAST_BATCH_SIZE, BROADCAST_LEASE)
+            if not user_ids:
+                break
+            if resumed:
+                # 只在确实领取到接收者时记录，租约未过期时的空轮询不刷日志
+                logger.info("续发广播任务 %s (组 %s)", job_id, group_id)
+                resumed = False
+            results = await broadcast(
+                user_ids,
+                lambda uid: _send_to_user(context.bot, uid, items, caption, protect, queue_id, job_id)
+            )
+            for r in results:
+                if isinstance(r, Exception):
+                    logger.error("并发发送异常: %s", r)
+            # 领取下一批前把本批结果落盘，检查点最多落后一批
+            await flush_writes()
+    else:
+        logger.info("组 %s 没有可发送的媒体或活跃用户，跳过发送", group_id)
 
-    active_users = get_active_users()
-    if not active_users:
-        logger.info("没有活跃用户，跳过发送")
-        update_queue_status(queue_ids, QueueStatus.DONE)
+    summary = finish_broadcast_job(job_id)
+    if summary is None:
+        # 上次运行领取的接收者租约尚未过期，稍后再续发
+        logger.debug("广播任务 %s 仍有未过期的租约，等待下次检查", job_id)
         return
 
-    # 过滤掉来源用户
-    target_users = [u for u in active_users if u['user_id'] != from_user_id]
-
-    logger.info("开始发送组 %s (%d个媒体) 给 %d 个用户，并发数=%d",
-                group_id, len(items), len(target_users), SEND_CONCURRENCY)
-
-    protect = PROTECT_CONTENT
-    blocked_count = 0
-
-    # 分批发送，每批 SEND_CONCURRENCY 个用户并发
-    for i in range(0, len(target_users), SEND_CONCURRENCY):
-        batch = target_users[i:i + SEND_CONCURRENCY]
-
-        tasks = [
-            _send_to_user(context.bot, u['user_id'], items, caption, protect, queue_ids[0])
-            for u in batch
-        ]
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for r in results:
-            if isinstance(r, Exception):
-                logger.error("并发发送异常: %s", r)
-                blocked_count += 1
-            elif not r[1]:
-                blocked_count += 1
-
-        # 批次间短暂间隔
-        if i + SEND_CONCURRENCY < len(target_users):
-            await asyncio.sleep(BATCH_INTERVAL)
-
-    # 标记完成
-    increment_sent_count(queue_ids)
-    update_queue_status(queue_ids, QueueStatus.DONE)
-
-    logger.info("组 %s 发送完成，%d/%d 成功，%d 个被标记拉黑",
-                group_id, len(target_users) - blocked_count, len(target_users), blocked_count)
+    logger.info("组 %s 发送完成，%d/%d 成功，%d 个被标记拉黑，%d 个已不活跃跳过",
+                group_id, summary['sent'], summary['total'], summary['blocked'], summary['skipped'])
 
     # 组间间隔
     await asyncio.sleep(VIDEO_INTERVAL)
@@ -0,0 +1,86 @@
+"""SQLite 连接池 - 复用预先配置好的长连接
+
+get_db() 借出的连接 close() 时归还连接池而不是真正关闭，调用方沿用 `conn = get_db() ... conn.close()` 写法即可；
+连接只在创建时设置一次 PRAGMA，并保留 sqlite3 的语句缓存（同一 SQL 复用已编译的语句）。
+
+本文件在多个 Bot 中各有一份（另见 docker_fileid/sqlite_pool.py、docker_vsender/database/sqlite_pool.py），内容需保持一致，修改时同步更新。
+"""
+import sqlite3
+import threading
+from typing import List
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接：close() 归还连接池"""
+
+    _pool = None
+    _borrowed = False
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """线程安全的连接池：空闲连接最多保留 size 个，借用时没有空闲连接就新建（不会阻塞）
+
+    连接以 check_same_thread=False 打开，同一时刻只借给一个调用方，可在 asyncio.to_thread 等线程中使用。
+    """
+
+    def __init__(self, path: str, size: int = 4, cache_size_kb: int = 16384,
+                 mmap_size: int = 134217728, cached_statements: int = 256):
+        self.path = path
+        self.size = size
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(self.path, timeout=30, factory=PooledConnection,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn._pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        conn._borrowed = True
+        return conn
+
+    def release(self, conn: PooledConnection):
+        if not conn._borrowed:
+            return  # 重复 close()
+        conn._borrowed = False
+        try:
+            # 与关闭连接的语义一致：未提交的事务被丢弃
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn._pool = None
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn._pool = None
+        conn.close()
+
+    def close_all(self):
+        """关闭所有空闲连接（退出时调用）"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn._pool = None
+            conn.close()
@@ -0,0 +1,96 @@
+"""异步写缓冲 - 广播期间的发送日志/状态更新合并为批量事务写入
+
+本文件在多个 Bot 中各有一份（另见 docker_vsender/database/write_buffer.py），内容需保持一致，修改时同步更新。
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """收集 (sql, 参数)，攒满 max_rows 条或首条入队 interval 秒后，在线程中用一个事务 executemany 写入
+
+    同一条 SQL 的参数合并为一次 executemany；不同 SQL 之间不保证先后顺序，只适合互不依赖的写入。
+    同一时间最多排队一个写入任务；写入失败的记录放回缓冲，稍后重试，不会丢弃。
+    """
+
+    def __init__(self, connect: Callable, max_rows: int = 500, interval: float = 0.5):
+        self._connect = connect
+        self.max_rows = max_rows
+        self.interval = interval
+        self._pending: Dict[str, List[tuple]] = {}
+        self._count = 0
+        self._timer = None
+        self._scheduled = False  # 已有写入任务在等待取走缓冲
+        self._lock = None
+        self._tasks = set()
+
+    def add(self, sql: str, params: tuple):
+        self._pending.setdefault(sql, []).append(params)
+        self._count += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中时直接写入
+            self._write(self._take())
+            return
+        if self._count >= self.max_rows:
+            self._spawn(loop)
+        elif self._timer is None and not self._scheduled:
+            self._timer = loop.call_later(self.interval, self._spawn, loop)
+
+    def _spawn(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._scheduled:
+            return
+        self._scheduled = True
+        task = loop.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _take(self) -> Dict[str, List[tuple]]:
+        rows, self._pending, self._count = self._pending, {}, 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return rows
+
+    def _requeue(self, rows: Dict[str, List[tuple]]):
+        """写入失败的记录放回缓冲头部，保持同一条 SQL 内的先后顺序"""
+        for sql, params in rows.items():
+            self._pending[sql] = params + self._pending.get(sql, [])
+            self._count += len(params)
+
+    def _write(self, rows: Dict[str, List[tuple]]):
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                for sql, params in rows.items():
+                    conn.executemany(sql, params)
+        finally:
+            conn.close()
+
+    async def flush(self):
+        """立即写入已缓冲的记录（依次执行，不会并发写库）"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._scheduled = False
+            rows = self._take()
+            if not rows:
+                return
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                # 检查点等记录是断点恢复的依据，失败时放回缓冲，interval 秒后重试
+                logger.error("批量写入失败，%d 条记录稍后重试: %s", sum(len(p) for p in rows.values()), e)
+                self._requeue(rows)
+                if self._timer is None and not self._scheduled:
+                    self._timer = asyncio.get_running_loop().call_later(
+                        self.interval, self._spawn, asyncio.get_running_loop())
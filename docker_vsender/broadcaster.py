@@ -0,0 +1,114 @@
+"""广播发送引擎 - 全局令牌桶 + 单聊天限速 + 常驻 worker 池
+
+所有广播发送都经过同一个令牌桶，总速率保持在 Telegram 全局限制（约 30 条/秒）以内；
+同一聊天两次发送至少间隔 PER_CHAT_INTERVAL 秒；收到 RetryAfter 时整个令牌桶暂停后重试。
+
+本文件在多个 Bot 中各有一份（另见 docker_vqueue/broadcaster.py），内容需保持一致，修改时同步更新。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from telegram.error import RetryAfter
+
+from config import SEND_RATE, SEND_BURST, PER_CHAT_INTERVAL, SEND_RETRIES, SEND_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个，最多积攒 capacity 个；令牌不足时按预约顺序等待"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    async def acquire(self, tokens: float = 1):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # 先扣减（可为负数），负数部分即需要等待补充的时间，保证先到先得
+        self._tokens -= tokens
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+        # 等待期间可能因 RetryAfter 被整体暂停
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """暂停发放令牌 seconds 秒（触发 flood 限制时调用）"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class ChatPacer:
+    """单个聊天的最小发送间隔"""
+
+    PRUNE_SIZE = 10000  # 记录数超过该值时清理已过期的聊天
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval
+        if len(self._next_slot) > self.PRUNE_SIZE:
+            self._next_slot = {k: v for k, v in self._next_slot.items() if v > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_bucket = TokenBucket(SEND_RATE, SEND_BURST)
+_chats = ChatPacer(PER_CHAT_INTERVAL)
+
+
+def _retry_seconds(e: RetryAfter) -> float:
+    retry_after = e.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+async def rate_limited(chat_id: int, call: Callable[[], Awaitable[Any]], cost: int = 1) -> Any:
+    """限速执行一次 Bot API 调用
+
+    call 为无参函数，每次（重试）调用返回新的协程；cost 为该调用计入的消息数（媒体组按条数计）。
+    遇到 RetryAfter 时暂停全局令牌桶并重试，超过 SEND_RETRIES 次后抛出。
+    """
+    for attempt in range(SEND_RETRIES + 1):
+        await _chats.wait(chat_id)
+        await _bucket.acquire(cost)
+        try:
+            return await call()
+        except RetryAfter as e:
+            if attempt >= SEND_RETRIES:
+                raise
+            delay = _retry_seconds(e)
+            logger.warning("触发 flood 限制，全局暂停 %.1f 秒后重试 (chat=%s)", delay, chat_id)
+            _bucket.pause(delay)
+
+
+async def broadcast(chat_ids: Sequence[int], send: Callable[[int], Awaitable[Any]],
+                    concurrency: int = SEND_CONCURRENCY) -> List[Any]:
+    """用 concurrency 个常驻 worker 依次取用户执行 send(chat_id)
+
+    某个用户发送慢不会阻塞其他用户；返回结果与 chat_ids 顺序一致，异常作为结果返回。
+    """
+    results: List[Any] = [None] * len(chat_ids)
+    pending = iter(enumerate(chat_ids))
+
+    async def worker():
+        for idx, chat_id in pending:
+            try:
+                results[idx] = await send(chat_id)
+            except Exception as e:
+                results[idx] = e
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(chat_ids)))))
+    return results
@@ -22,11 +22,33 @@ VIDEO_EXTS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.ts', '.
 # 数据库路径
 DB_PATH = os.getenv('DB_PATH', './data/vsender.db')
 
-# 发送并发数
+# 连接池保留的空闲连接数
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+# 每个连接的页缓存（KB）
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+
+# 内存映射读取上限（字节）
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', '134217728'))
+
+# 发送并发数（同时在途的发送数）
 SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '5'))
 
-# 批次间间隔（秒）
-BATCH_INTERVAL = float(os.getenv('BATCH_INTERVAL', '1.0'))
+# 全局发送速率（条/秒），Telegram 上限约 30
+SEND_RATE = float(os.getenv('SEND_RATE', '25'))
+
+# 令牌桶容量（允许的瞬时突发条数）
+SEND_BURST = float(os.getenv('SEND_BURST', '5'))
+
+# 同一聊天两次发送的最小间隔（秒）
+PER_CHAT_INTERVAL = float(os.getenv('PER_CHAT_INTERVAL', '1.0'))
+
+# 遇到 RetryAfter 时的最大重试次数
+SEND_RETRIES = int(os.getenv('SEND_RETRIES', '3'))
+
+# 发送明细批量写入：攒满 N 条或间隔 T 秒写一次
+WRITE_BATCH_ROWS = int(os.getenv('WRITE_BATCH_ROWS', '500'))
+WRITE_FLUSH_INTERVAL = float(os.getenv('WRITE_FLUSH_INTERVAL', '0.5'))
 
 # 视频间间隔（秒）
 VIDEO_INTERVAL = float(os.getenv('VIDEO_INTERVAL', '3.0'))
@@ -1,12 +1,13 @@
 """数据库操作模块 - 统一导出接口"""
 
 # 连接管理
-from database.connection import get_db, init_db
+from database.connection import get_db, init_db, close_db
 
 # 用户操作
 from database.users import (
     add_user, remove_user, ban_user, unban_user, get_user,
-    get_active_users, get_all_users, update_user_status, get_user_count
+    get_active_users, get_active_user_ids, get_all_users, update_user_status, get_user_count,
+    active_roster
 )
 
 # 加入请求操作
@@ -18,26 +19,29 @@ from database.requests import (
 from database.videos import (
     scan_video_files, get_video_files, get_video_by_path, get_video_by_name,
     get_unsent_videos, get_videos_in_dir, mark_video_sent, mark_video_unsent,
-    get_video_stats, get_subdirs
+    get_video_stats, get_subdirs, get_video_media, set_video_media
 )
 
 # 发送日志操作
 from database.send_log import (
-    create_send_log, update_send_log, log_send_detail
+    create_send_log, update_send_log, log_send_detail,
+    record_send_detail, flush_send_details
 )
 
 __all__ = [
     # connection
-    'get_db', 'init_db',
+    'get_db', 'init_db', 'close_db',
     # users
     'add_user', 'remove_user', 'ban_user', 'unban_user', 'get_user',
-    'get_active_users', 'get_all_users', 'update_user_status', 'get_user_count',
+    'get_active_users', 'get_active_user_ids', 'get_all_users', 'update_user_status', 'get_user_count',
+    'active_roster',
     # requests
     'add_join_request', 'get_pending_requests', 'approve_request', 'reject_request',
     # videos
     'scan_video_files', 'get_video_files', 'get_video_by_path', 'get_video_by_name',
     'get_unsent_videos', 'get_videos_in_dir', 'mark_video_sent', 'mark_video_unsent',
-    'get_video_stats', 'get_subdirs',
+    'get_video_stats', 'get_subdirs', 'get_video_media', 'set_video_media',
     # send_log
     'create_send_log', 'update_send_log', 'log_send_detail',
+    'record_send_detail', 'flush_send_details',
 ]
\ No newline at end of file
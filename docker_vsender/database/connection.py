@@ -1,19 +1,31 @@
 """数据库连接管理"""
-import sqlite3
 import os
 import logging
 
-from config import DB_PATH
+from config import DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+from database.sqlite_pool import ConnectionPool
 
 logger = logging.getLogger(__name__)
 
+_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE)
+
 
 def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """从连接池借出数据库连接，close() 时归还"""
+    return _pool.acquire()
+
+
+def close_db():
+    """关闭连接池中的空闲连接"""
+    _pool.close_all()
+
+
+def _ensure_column(conn, table: str, column: str, column_type: str):
+    """字段不存在时添加"""
+    columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        logger.info("已添加字段: %s.%s", table, column)
 
 
 def init_db():
@@ -50,7 +62,9 @@ def init_db():
                 status TEXT DEFAULT 'unsend',
                 sent_at TEXT,
                 sent_count INTEGER DEFAULT 0,
-                created_at TEXT
+                created_at TEXT,
+                tg_file_id TEXT,
+                tg_file_type TEXT
             );
             CREATE INDEX IF NOT EXISTS idx_vf_status ON video_files(status);
             CREATE INDEX IF NOT EXISTS idx_vf_path ON video_files(file_path);
@@ -78,6 +92,9 @@ def init_db():
             );
             CREATE INDEX IF NOT EXISTS idx_sd_log ON send_details(send_log_id);
         ''')
+        # 旧数据库补充新增字段
+        _ensure_column(conn, 'video_files', 'tg_file_id', 'TEXT')
+        _ensure_column(conn, 'video_files', 'tg_file_type', 'TEXT')
         conn.commit()
         logger.info("数据库初始化完成")
     finally:
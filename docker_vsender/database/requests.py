@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Optional, List, Dict
 
 from database.connection import get_db
+from database.users import active_roster
 
 logger = logging.getLogger(__name__)
 
@@ -73,12 +74,14 @@ def approve_request(request_id: int, reviewed_by: int) -> Optional[Dict]:
             (reviewed_by, now, request_id)
         )
         # 添加用户到白名单
-        conn.execute(
+        added = conn.execute(
             """INSERT OR IGNORE INTO users (user_id, username, status, added_by, registered_at, updated_at)
                VALUES (?, ?, 'active', ?, ?, ?)""",
             (req_dict['user_id'], req_dict['username'], reviewed_by, now, now)
-        )
+        ).rowcount
         conn.commit()
+        if added:
+            active_roster.add(req_dict['user_id'])
         return req_dict
     except Exception as e:
         logger.error("批准请求失败: %s", e)
@@ -0,0 +1,58 @@
+"""活跃用户名单 - 常驻内存的活跃用户ID，广播时无需查库
+
+本文件在多个 Bot 中各有一份（另见 docker_vqueue/roster.py），内容需保持一致，修改时同步更新。
+"""
+from array import array
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+
+class ActiveRoster:
+    """按 user_id 有序保存的活跃用户ID（array('q')，每人 8 字节）
+
+    首次使用时由 loader 从数据库加载一次，之后由修改用户状态的函数就地增删。
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[int]]):
+        self._loader = loader
+        self._ids = None
+
+    def _load(self) -> array:
+        if self._ids is None:
+            self._ids = array('q', sorted(self._loader()))
+        return self._ids
+
+    def load(self) -> int:
+        """（重新）从数据库加载，返回活跃用户数"""
+        self._ids = None
+        return len(self._load())
+
+    def add(self, user_id: int):
+        ids = self._load()
+        i = bisect_left(ids, user_id)
+        if i == len(ids) or ids[i] != user_id:
+            ids.insert(i, user_id)
+
+    def discard(self, user_id: int):
+        ids = self._load()
+        i = bisect_left(ids, user_id)
+        if i < len(ids) and ids[i] == user_id:
+            del ids[i]
+
+    def set_active(self, user_id: int, active: bool):
+        if active:
+            self.add(user_id)
+        else:
+            self.discard(user_id)
+
+    def snapshot(self) -> array:
+        """当前名单的副本（广播期间名单变化不影响本次发送）"""
+        return array('q', self._load())
+
+    def __contains__(self, user_id: int) -> bool:
+        ids = self._load()
+        i = bisect_left(ids, user_id)
+        return i < len(ids) and ids[i] == user_id
+
+    def __len__(self) -> int:
+        return len(self._load())
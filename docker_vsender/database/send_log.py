@@ -3,10 +3,16 @@ import logging
 from datetime import datetime
 from typing import Optional
 
+from config import WRITE_BATCH_ROWS, WRITE_FLUSH_INTERVAL
 from database.connection import get_db
+from database.users import update_user_status
+from database.write_buffer import WriteBuffer
 
 logger = logging.getLogger(__name__)
 
+# 广播发送明细写缓冲（send_details）
+_detail_writes = WriteBuffer(get_db, WRITE_BATCH_ROWS, WRITE_FLUSH_INTERVAL)
+
 
 def create_send_log(admin_user_id: int, video_file_id: Optional[int],
                     file_path: str, caption: str, total_users: int) -> int:
@@ -51,4 +57,20 @@ def log_send_detail(log_id: int, user_id: int, status: str):
         )
         conn.commit()
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def record_send_detail(log_id: int, user_id: int, success: bool):
+    """缓冲写入发送明细，失败时直接标记用户为 stopped"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _detail_writes.add(
+        "INSERT INTO send_details (send_log_id, to_user_id, status, created_at) VALUES (?, ?, ?, ?)",
+        (log_id, user_id, 'sent' if success else 'blocked', now)
+    )
+    if not success:
+        # 用户状态直接写库，不经缓冲：避免缓冲中的旧状态覆盖随后管理员解封的状态
+        update_user_status(user_id, 'stopped')
+
+
+async def flush_send_details():
+    """立即写入缓冲中的发送明细"""
+    await _detail_writes.flush()
@@ -1,13 +1,26 @@
 """用户相关数据库操作"""
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Sequence
 
 from database.connection import get_db
+from database.roster import ActiveRoster
 
 logger = logging.getLogger(__name__)
 
 
+def _load_active_ids():
+    conn = get_db()
+    try:
+        return [r['user_id'] for r in conn.execute("SELECT user_id FROM users WHERE status = 'active'")]
+    finally:
+        conn.close()
+
+
+# 活跃用户名单（内存），由修改用户状态的函数同步维护
+active_roster = ActiveRoster(_load_active_ids)
+
+
 def add_user(user_id: int, username: str = "", added_by: int = 0, notes: str = "") -> bool:
     """添加用户到白名单"""
     conn = get_db()
@@ -24,6 +37,7 @@ def add_user(user_id: int, username: str = "", added_by: int = 0, notes: str = "
             (user_id, username, added_by, notes, now, now)
         )
         conn.commit()
+        active_roster.add(user_id)
         return True
     except Exception as e:
         logger.error("添加用户失败: %s", e)
@@ -36,9 +50,10 @@ def remove_user(user_id: int) -> bool:
     """移除用户"""
     conn = get_db()
     try:
-        conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        cur = conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
         conn.commit()
-        return conn.total_changes > 0
+        active_roster.discard(user_id)
+        return cur.rowcount > 0
     finally:
         conn.close()
 
@@ -48,12 +63,13 @@ def ban_user(user_id: int) -> bool:
     conn = get_db()
     try:
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn.execute(
+        cur = conn.execute(
             "UPDATE users SET status = 'banned', updated_at = ? WHERE user_id = ?",
             (now, user_id)
         )
         conn.commit()
-        return conn.total_changes > 0
+        active_roster.discard(user_id)
+        return cur.rowcount > 0
     finally:
         conn.close()
 
@@ -63,12 +79,14 @@ def unban_user(user_id: int) -> bool:
     conn = get_db()
     try:
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        conn.execute(
+        cur = conn.execute(
             "UPDATE users SET status = 'active', updated_at = ? WHERE user_id = ?",
             (now, user_id)
         )
         conn.commit()
-        return conn.total_changes > 0
+        if cur.rowcount > 0:
+            active_roster.add(user_id)
+        return cur.rowcount > 0
     finally:
         conn.close()
 
@@ -95,6 +113,11 @@ def get_active_users() -> List[Dict]:
         conn.close()
 
 
+def get_active_user_ids() -> Sequence[int]:
+    """活跃用户ID（内存名单的快照，按 user_id 排序）"""
+    return active_roster.snapshot()
+
+
 def get_all_users() -> List[Dict]:
     """获取所有用户"""
     conn = get_db()
@@ -115,6 +138,7 @@ def update_user_status(user_id: int, status: str):
             (status, now, user_id)
         )
         conn.commit()
+        active_roster.set_active(user_id, status == 'active')
     finally:
         conn.close()
 
@@ -2,7 +2,7 @@
 import logging
 import os
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
 from config import VIDEO_ROOT, VIDEO_EXTS
 from database.connection import get_db
@@ -172,6 +172,33 @@ def mark_video_sent(video_file_id: int):
         conn.close()
 
 
+def get_video_media(video_file_id: int) -> Optional[Tuple[str, str]]:
+    """获取视频已上传到 Telegram 的 (file_id, 类型)，未上传过返回 None"""
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT tg_file_id, tg_file_type FROM video_files WHERE id = ?", (video_file_id,)
+        ).fetchone()
+        if row and row['tg_file_id']:
+            return row['tg_file_id'], row['tg_file_type'] or 'video'
+        return None
+    finally:
+        conn.close()
+
+
+def set_video_media(video_file_id: int, tg_file_id: Optional[str], tg_file_type: Optional[str]):
+    """保存视频上传后的 file_id，传 None 表示清除"""
+    conn = get_db()
+    try:
+        conn.execute(
+            "UPDATE video_files SET tg_file_id = ?, tg_file_type = ? WHERE id = ?",
+            (tg_file_id, tg_file_type, video_file_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def mark_video_unsent(video_file_id: int):
     """标记视频为未发送"""
     conn = get_db()
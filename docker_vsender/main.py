@@ -10,7 +10,7 @@ from config import (
     CONNECT_TIMEOUT, READ_TIMEOUT, WRITE_TIMEOUT,
     POOL_TIMEOUT, MEDIA_WRITE_TIMEOUT
 )
-from database import init_db, scan_video_files
+from database import init_db, scan_video_files, flush_send_details, close_db, active_roster
 from handlers import (
     cmd_start, cmd_help, cmd_myid, cmd_status, cmd_request,
     cmd_adduser, cmd_removeuser, cmd_ban, cmd_unban,
@@ -28,10 +28,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def post_shutdown(application):
+    """退出前写入缓冲中的发送明细并关闭数据库连接"""
+    await flush_send_details()
+    close_db()
+
+
 def main():
     # 数据库初始化
     init_db()
     logger.info("数据库初始化完成")
+    logger.info("已加载活跃用户名单: %d 人", active_roster.load())
 
     # 扫描视频目录
     result = scan_video_files()
@@ -48,7 +55,7 @@ def main():
         pool_timeout=POOL_TIMEOUT,
         media_write_timeout=MEDIA_WRITE_TIMEOUT
     )
-    builder = ApplicationBuilder().token(TOKEN).request(request)
+    builder = ApplicationBuilder().token(TOKEN).request(request).post_shutdown(post_shutdown)
     if base_url:
         builder.base_url(f"{base_url}/bot")
         builder.base_file_url(f"{base_url}/file/bot")
@@ -2,14 +2,17 @@
 import asyncio
 import logging
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import ContextTypes
 
-from config import SEND_CONCURRENCY, BATCH_INTERVAL, VIDEO_INTERVAL
+from broadcaster import rate_limited, broadcast
+from config import VIDEO_INTERVAL
 from database import (
-    get_active_users, mark_video_sent, update_user_status,
-    create_send_log, update_send_log, log_send_detail
+    get_active_user_ids, mark_video_sent,
+    create_send_log, update_send_log, record_send_detail, flush_send_details,
+    get_video_media, set_video_media
 )
 
 logger = logging.getLogger(__name__)
@@ -24,28 +27,101 @@ def format_size(size_bytes: int) -> str:
     return f"{size_bytes:.1f}TB"
 
 
-async def send_video_to_user(bot, chat_id: int, video_path: str,
-                             caption: str = "") -> bool:
-    """发送本地视频文件给单个用户，返回是否成功"""
-    try:
+async def _deliver(bot, chat_id: int, video_path: str, caption: str = "",
+                   media: Optional[Tuple[str, str]] = None):
+    """media 为 (file_id, 类型) 时按 file_id 转发，否则上传本地文件，返回发送的消息（经限速引擎发送）"""
+    caption = caption[:1024] if caption else ""
+    if media:
+        file_id, file_type = media
+        if file_type == 'document':
+            return await rate_limited(chat_id, lambda: bot.send_document(
+                chat_id=chat_id, document=file_id, caption=caption))
+        return await rate_limited(chat_id, lambda: bot.send_video(
+            chat_id=chat_id, video=file_id, caption=caption, supports_streaming=True))
+
+    async def upload():
+        # 每次重试重新打开文件
         with open(video_path, 'rb') as vf:
-            await bot.send_video(
+            return await bot.send_video(
                 chat_id=chat_id,
                 video=vf,
-                caption=caption[:1024] if caption else "",
+                caption=caption,
                 supports_streaming=True
             )
+    return await rate_limited(chat_id, upload)
+
+
+def _media_from_message(message) -> Optional[Tuple[str, str]]:
+    """从上传后的消息中取出 file_id（部分格式会被 Telegram 当作文件发送）"""
+    if message and message.video:
+        return message.video.file_id, 'video'
+    if message and message.document:
+        return message.document.file_id, 'document'
+    return None
+
+
+# file_id 本身失效（需要重新上传）的错误信息
+_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference expired",
+                   "file_reference_expired")
+# 只与接收者有关的错误信息（换下一个用户即可）
+_RECIPIENT_ERRORS = ("chat not found", "user not found", "deactivated", "blocked", "peer_id_invalid")
+
+
+def _is_file_id_error(e: Exception) -> bool:
+    return isinstance(e, BadRequest) and any(m in str(e).lower() for m in _FILE_ID_ERRORS)
+
+
+def _is_recipient_error(e: Exception) -> bool:
+    return isinstance(e, Forbidden) or (
+        isinstance(e, BadRequest) and any(m in str(e).lower() for m in _RECIPIENT_ERRORS))
+
+
+def _log_send_error(chat_id: int, e: Exception):
+    error_str = str(e)
+    # 检测拉黑/封禁
+    if "Forbidden" in error_str or "blocked" in error_str.lower() or "deactivated" in error_str.lower():
+        logger.warning("用户 %s 已拉黑bot: %s", chat_id, error_str)
+    else:
+        logger.error("发送视频到 %s 失败: %s", chat_id, e)
+
+
+async def send_video_to_user(bot, chat_id: int, video_path: str,
+                             caption: str = "", media: Optional[Tuple[str, str]] = None) -> bool:
+    """发送视频给单个用户（有 media 时按 file_id 发送），返回是否成功"""
+    try:
+        await _deliver(bot, chat_id, video_path, caption, media)
         return True
     except Exception as e:
-        error_str = str(e)
-        # 检测拉黑/封禁
-        if "Forbidden" in error_str or "blocked" in error_str.lower() or "deactivated" in error_str.lower():
-            logger.warning("用户 %s 已拉黑bot: %s", chat_id, error_str)
-            return False
-        logger.error("发送视频到 %s 失败: %s", chat_id, e)
+        _log_send_error(chat_id, e)
         return False
 
 
+async def _upload_and_log(bot, user_id: int, video_path: str, caption: str, log_id: int,
+                          media: Optional[Tuple[str, str]] = None):
+    """发送给首个用户：优先用已有 file_id，file_id 失效时重新上传本地文件
+
+    返回 (结果, media)，media 为本次可供后续用户复用的 file_id；
+    只与该用户有关的错误记为该用户失败，上传本身失败（文件过大、网络、超时等）时抛出异常
+    """
+    if media:
+        try:
+            await _deliver(bot, user_id, video_path, caption, media)
+            return _record_send(log_id, user_id, True), media
+        except Exception as e:
+            if not _is_file_id_error(e):
+                _log_send_error(user_id, e)
+                return _record_send(log_id, user_id, False), media
+            logger.warning("file_id 已失效，重新上传: %s", e)
+    try:
+        message = await _deliver(bot, user_id, video_path, caption)
+    except Exception as e:
+        if not _is_recipient_error(e):
+            raise
+        _log_send_error(user_id, e)
+        return _record_send(log_id, user_id, False), None
+    return _record_send(log_id, user_id, True), _media_from_message(message)
+
+
 async def broadcast_video(
     context: ContextTypes.DEFAULT_TYPE,
     video_path: str,
@@ -61,8 +137,10 @@ async def broadcast_video(
         logger.error("视频文件不存在: %s", video_path)
         return {'success': 0, 'fail': 0, 'blocked': [], 'error': '文件不存在'}
 
-    active_users = get_active_users()
-    if not active_users:
+    # 内存名单快照（array），不查库
+    user_ids = get_active_user_ids()
+    total_users = len(user_ids)
+    if not user_ids:
         logger.info("没有活跃用户，跳过发送")
         return {'success': 0, 'fail': 0, 'blocked': [], 'error': '没有活跃用户'}
 
@@ -75,7 +153,7 @@ async def broadcast_video(
         video_file_id=video_file_id,
         file_path=video_path,
         caption=caption,
-        total_users=len(active_users)
+        total_users=total_users
     )
 
     # 通知管理员开始发送
@@ -84,7 +162,7 @@ async def broadcast_video(
             chat_id=admin_user_id,
             text=f"📤 开始发送: {file_name}\n"
                  f"📦 大小: {format_size(file_size)}\n"
-                 f"👥 目标用户: {len(active_users)} 人\n"
+                 f"👥 目标用户: {total_users} 人\n"
                  f"⏳ 发送中..."
         )
     except Exception:
@@ -94,44 +172,63 @@ async def broadcast_video(
     fail_count = 0
     blocked_users = []
 
-    # 分批发送
-    for i in range(0, len(active_users), SEND_CONCURRENCY):
-        batch = active_users[i:i + SEND_CONCURRENCY]
-
-        tasks = []
-        for user in batch:
-            tasks.append(
-                _send_and_log(context.bot, user['user_id'], video_path, caption, log_id)
+    def tally(r):
+        nonlocal success_count, fail_count
+        if isinstance(r, Exception):
+            logger.error("发送异常: %s", r)
+            fail_count += 1
+        elif r['success']:
+            success_count += 1
+        else:
+            fail_count += 1
+            blocked_users.append(r['user_id'])
+
+    # 只上传一次：先发给一个用户拿到 file_id，其余用户（以及之后的重发）都按 file_id 发送
+    stored_media = get_video_media(video_file_id) if video_file_id else None
+    media = stored_media
+    uploaded = False
+    try:
+        while user_ids and not uploaded:
+            r, media = await _upload_and_log(context.bot, user_ids.pop(0), video_path, caption, log_id, media)
+            tally(r)
+            uploaded = media is not None and r['success']
+    except Exception as e:
+        # 上传本身失败，换用户重试也无济于事：中止本次广播并通知管理员
+        logger.error("上传视频失败，中止发送 %s: %s", file_name, e)
+        await flush_send_details()
+        update_send_log(log_id, success_count, fail_count, 'failed')
+        try:
+            await context.bot.send_message(
+                chat_id=admin_user_id,
+                text=f"❌ 上传失败，已中止发送: {file_name}\n原因: {e}"
             )
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for idx, r in enumerate(results):
-            if isinstance(r, Exception):
-                logger.error("发送异常: %s", r)
-                fail_count += 1
-            elif r['success']:
-                success_count += 1
-            else:
-                fail_count += 1
-                blocked_users.append(r['user_id'])
-
-        # 批次间间隔
-        if i + SEND_CONCURRENCY < len(active_users):
-            await asyncio.sleep(BATCH_INTERVAL)
+        except Exception:
+            pass
+        return {'success': success_count, 'fail': fail_count, 'blocked': blocked_users, 'error': str(e)}
+    if video_file_id and media != stored_media:
+        set_video_media(video_file_id, *(media or (None, None)))
+
+    # 其余用户由限速引擎的 worker 池发送
+    results = await broadcast(
+        user_ids,
+        lambda uid: _send_and_log(context.bot, uid, video_path, caption, log_id, media)
+    )
+    for r in results:
+        tally(r)
 
     # 标记视频已发送
     if video_file_id:
         mark_video_sent(video_file_id)
 
-    # 更新发送日志
+    # 更新发送日志（先写入缓冲中的明细）
+    await flush_send_details()
     update_send_log(log_id, success_count, fail_count, 'done')
 
     # 通知管理员发送结果
     result_text = (
         f"✅ 发送完成: {file_name}\n"
         f"📊 成功: {success_count} / 失败: {fail_count}\n"
-        f"👥 目标: {len(active_users)} 人"
+        f"👥 目标: {total_users} 人"
     )
     if blocked_users:
         result_text += f"\n🚫 被拉黑用户: {len(blocked_users)} 人（已自动标记）"
@@ -148,19 +245,18 @@ async def broadcast_video(
     }
 
 
+def _record_send(log_id: int, user_id: int, success: bool) -> Dict:
+    """记录发送结果（批量写入），失败的用户标记为 stopped"""
+    record_send_detail(log_id, user_id, success)
+    return {'user_id': user_id, 'success': success}
+
+
 async def _send_and_log(bot, user_id: int, video_path: str,
-                        caption: str, log_id: int) -> Dict:
+                        caption: str, log_id: int,
+                        media: Optional[Tuple[str, str]] = None) -> Dict:
     """发送视频并记录结果"""
-    success = await send_video_to_user(bot, user_id, video_path, caption)
-
-    if success:
-        log_send_detail(log_id, user_id, 'sent')
-        return {'user_id': user_id, 'success': True}
-    else:
-        # 标记用户为 stopped
-        update_user_status(user_id, 'stopped')
-        log_send_detail(log_id, user_id, 'blocked')
-        return {'user_id': user_id, 'success': False}
+    success = await send_video_to_user(bot, user_id, video_path, caption, media)
+    return _record_send(log_id, user_id, success)
 
 
 async def send_videos_batch(